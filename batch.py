@@ -0,0 +1,272 @@
+# batch.py: resolve vários tabuleiros de Bimaru num só processo.
+#
+# Por exemplo:
+#     $ python3 batch.py --check instances-students
+#     $ python3 batch.py "instances-students/instance0*.txt"
+#     $ python3 batch.py --jobs 8 --timeout 10 --unordered corpus/
+#     $ python3 batch.py --stream --jobs 8 nightly.txt
+
+import argparse
+import glob
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from bimaru import SEARCHES, Bimaru, Board, SolutionWriter, split_instances, stream_lines
+from search import InstrumentedProblem
+
+GREEN = "\033[0;32m"
+RED = "\033[0;31m"
+NC = "\033[0m"
+
+
+def instance_paths(patterns):
+    """Expande diretórios (todos os .txt lá dentro), globs e ficheiros."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths += sorted(glob.glob(os.path.join(pattern, "*.txt")))
+        elif glob.has_magic(pattern):
+            paths += sorted(glob.glob(pattern))
+        else:
+            paths.append(pattern)
+    return paths
+
+
+def expected_output(path):
+    """Conteúdo do .out correspondente a 'path', ou None se não existir."""
+    expected = os.path.splitext(path)[0] + ".out"
+    if not os.path.exists(expected):
+        return None
+    with open(expected) as stream:
+        return stream.read().rstrip("\n")
+
+
+class Timeout(Exception):
+    pass
+
+
+@contextmanager
+def time_limit(seconds):
+    """Interrompe o bloco com Timeout ao fim de 'seconds' (None: sem limite)."""
+    if not seconds:
+        yield
+        return
+
+    def expire(signum, frame):
+        raise Timeout()
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def instances(paths, stream=False, check=False):
+    """Gera (nome, linhas, saída esperada) para cada instância. Com 'stream'
+    cada ficheiro pode ter várias instâncias seguidas e é lido aos poucos
+    (ver bimaru.split_instances)."""
+    for path in paths:
+        base = os.path.splitext(os.path.basename(path))[0]
+        if stream:
+            for number, lines in enumerate(split_instances(stream_lines(path)), 1):
+                yield "{}#{}".format(base, number), lines, None
+        else:
+            with open(path) as source:
+                lines = source.readlines()
+            yield base, lines, expected_output(path) if check else None
+
+
+def solve_instance(name, lines, branching="fleet", search="dfs", expected=None, timeout=None):
+    """Resolve a instância dada pelas suas linhas e retorna um dicionário com
+    a solução, os tempos e as contagens de nós. Um erro na instância (linhas
+    mal formadas, frota que não cabe) fica em "error" em vez de parar o
+    lote."""
+    start = time.perf_counter()
+    problem = None
+    node = None
+    timed_out = False
+    error = None
+    try:
+        with time_limit(timeout):
+            board = Board.from_lines(lines)
+            problem = InstrumentedProblem(Bimaru(board, branching))
+            node = SEARCHES[search](problem)
+    except Timeout:
+        timed_out = True
+    except Exception as exc:
+        error = "{}: {}".format(type(exc).__name__, exc)
+    elapsed = time.perf_counter() - start
+
+    output = str(node.state) if node is not None else None
+    passed = None
+    if expected is not None and not timed_out and error is None:
+        passed = output == expected
+
+    return {
+        "instance": name,
+        "output": output,
+        "expected": expected,
+        "passed": passed,
+        "timeout": timed_out,
+        "error": error,
+        "time": elapsed,
+        "expanded": problem.succs if problem is not None else 0,
+        "generated": problem.states if problem is not None else 0,
+    }
+
+
+def solve_task(task):
+    """Ponto de entrada dos processos do pool: solve_instance(*task)."""
+    return solve_instance(*task)
+
+
+def solve_all(instances, branching="fleet", search="dfs", timeout=None, jobs=1,
+              ordered=True, window=256):
+    """Gera os resultados de todas as instâncias. Com jobs > 1 usa um pool
+    de processos que ficam vivos durante todo o lote; os resultados saem
+    pela ordem de 'instances' ou, com ordered=False, à medida que terminam.
+    O pool lê as instâncias à medida que precisa, mas nunca mais de 'window'
+    à frente dos resultados já consumidos, para não ler um stream inteiro
+    para memória."""
+    tasks = (
+        (name, lines, branching, search, expected, timeout)
+        for name, lines, expected in instances
+    )
+    if jobs <= 1:
+        for task in tasks:
+            yield solve_task(task)
+        return
+
+    # O gerador corre na thread do pool que distribui as tarefas: fica
+    # parado no semáforo até um resultado ser consumido. Se o consumo parar
+    # (exceção, Ctrl-C, gerador fechado), 'closed' e os lugares libertados
+    # deixam essa thread sair, senão Pool.terminate ficava à espera dela.
+    slots = threading.Semaphore(window)
+    closed = threading.Event()
+
+    def bounded():
+        for task in tasks:
+            slots.acquire()
+            if closed.is_set():
+                return
+            yield task
+
+    with multiprocessing.Pool(jobs) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        try:
+            for result in imap(solve_task, bounded(), chunksize=1):
+                slots.release()
+                yield result
+        finally:
+            closed.set()
+            for _ in range(window):
+                slots.release()
+
+
+def report(result, verbose=False, color=False, stream=sys.stdout):
+    name = result["instance"]
+    if result["error"] is not None:
+        status = RED + "ERROR" + NC if color else "ERROR"
+        status += " [{}]".format(result["error"])
+    elif result["timeout"]:
+        status = RED + "TIMEOUT" + NC if color else "TIMEOUT"
+    elif result["passed"] is None:
+        status = "SOLVED" if result["output"] is not None else "NO SOLUTION"
+    elif result["passed"]:
+        status = GREEN + "PASSED" + NC if color else "PASSED"
+    else:
+        status = RED + "FAILED" + NC if color else "FAILED"
+
+    stream.write(
+        "{} {} ({:.3f} seconds, {} expanded, {} generated)\n".format(
+            name, status, result["time"], result["expanded"], result["generated"]
+        )
+    )
+    if verbose:
+        stream.write("Output:\n{}\n".format(result["output"]))
+        if result["expected"] is not None:
+            stream.write("Desired Output:\n{}\n".format(result["expected"]))
+        stream.write("\n")
+
+
+def summary(results, elapsed, stream=sys.stdout):
+    checked = [result for result in results if result["passed"] is not None]
+    passed = sum(1 for result in checked if result["passed"])
+    solved = sum(1 for result in results if result["output"] is not None)
+    timeouts = sum(1 for result in results if result["timeout"])
+    errors = sum(1 for result in results if result["error"] is not None)
+    stream.write(
+        "{} instances, {} solved, {} timeouts, {} errors, {}/{} passed, {} expanded, "
+        "{:.3f} seconds\n".format(
+            len(results),
+            solved,
+            timeouts,
+            errors,
+            passed,
+            len(checked),
+            sum(result["expanded"] for result in results),
+            elapsed,
+        )
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Resolve vários tabuleiros de Bimaru num só processo."
+    )
+    parser.add_argument("paths", nargs="+", help="ficheiros, diretórios ou globs de .txt")
+    parser.add_argument("--branching", choices=Bimaru.BRANCHING, default="fleet")
+    parser.add_argument("--search", choices=SEARCHES, default="dfs")
+    parser.add_argument("--check", action="store_true", help="compara com os .out")
+    parser.add_argument(
+        "--stream", action="store_true", help="cada ficheiro tem várias instâncias seguidas"
+    )
+    parser.add_argument("-o", "--output", help="ficheiro onde escrever as soluções")
+    parser.add_argument("-v", "--verbose", action="store_true", help="mostra as soluções")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="número de processos")
+    parser.add_argument("--timeout", type=float, help="limite em segundos por instância")
+    parser.add_argument(
+        "--unordered", action="store_true", help="mostra os resultados à medida que terminam"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    color = sys.stdout.isatty()
+
+    start = time.perf_counter()
+    results = []
+    paths = args.paths if args.stream else instance_paths(args.paths)
+    output = open(args.output, "wb") if args.output else None
+    writer = SolutionWriter(output) if output else None
+    try:
+        for result in solve_all(instances(paths, args.stream, args.check), args.branching,
+                                args.search, args.timeout, args.jobs, not args.unordered):
+            report(result, args.verbose, color)
+            if writer is not None and result["output"] is not None:
+                writer.write_text("# {}\n{}\n".format(result["instance"], result["output"]))
+            results.append(result)
+    finally:
+        if writer is not None:
+            writer.close()
+            output.close()
+    summary(results, time.perf_counter() - start)
+
+    failed = any(
+        result["passed"] is False or result["timeout"] or result["error"] is not None
+        for result in results
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+# benchmark.py: mede o solver num corpus de instâncias e escreve JSON.
+#
+# Cada instância é resolvida com cada combinação de procura e modo de
+# ramificação, num processo próprio (para que o pico de RSS seja o dessa
+# execução). Para cada execução ficam registados o tempo real, o tempo de
+# CPU, o pico de RSS, os nós expandidos e o tempo gasto em parse_instance,
+# actions, result e goal_test.
+#
+# Por exemplo:
+#     $ python3 benchmark.py instances-students --output before.json
+#     $ python3 benchmark.py instances-students --output after.json
+#     $ python3 benchmark.py --compare before.json after.json
+
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+from batch import Timeout, instance_paths, time_limit
+from bimaru import SEARCHES, Bimaru, Board
+from search import InstrumentedProblem
+
+
+class TimedProblem(InstrumentedProblem):
+    """InstrumentedProblem que também acumula o tempo de cada fase."""
+
+    def __init__(self, problem):
+        super().__init__(problem)
+        self.phases = {"actions": 0.0, "result": 0.0, "goal_test": 0.0}
+
+    def actions(self, state):
+        start = time.perf_counter()
+        actions = iter(super().actions(state))
+        self.phases["actions"] += time.perf_counter() - start
+        return self.timed(actions)
+
+    def timed(self, actions):
+        """Gera as mesmas ações, somando a 'actions' só o tempo de cada
+        next(): um gerador preguiçoso (modo "fleet") continua preguiçoso e a
+        procura paga apenas as ações que chega a pedir. Um Timeout a meio
+        de um next() também conta."""
+        phases = self.phases
+        while True:
+            start = time.perf_counter()
+            try:
+                action = next(actions)
+            except StopIteration:
+                return
+            finally:
+                phases["actions"] += time.perf_counter() - start
+            yield action
+
+    def result(self, state, action):
+        start = time.perf_counter()
+        result = super().result(state, action)
+        self.phases["result"] += time.perf_counter() - start
+        return result
+
+    def goal_test(self, state):
+        start = time.perf_counter()
+        result = super().goal_test(state)
+        self.phases["goal_test"] += time.perf_counter() - start
+        return result
+
+
+def measure(task):
+    """Resolve uma instância com uma estratégia e retorna as medições."""
+    path, search, branching, timeout = task
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    run = {"instance": path, "search": search, "branching": branching}
+    problem = None
+    parse = None
+    try:
+        with time_limit(timeout):
+            start = time.perf_counter()
+            with open(path) as stream:
+                board = Board.parse_instance(stream)
+            parse = time.perf_counter() - start
+            run["cells"] = board.height * board.width
+
+            problem = TimedProblem(Bimaru(board, branching))
+            node = SEARCHES[search](problem)
+        run["status"] = "solved" if node is not None else "unsolvable"
+    except Timeout:
+        run["status"] = "timeout"
+
+    run["wall"] = time.perf_counter() - wall
+    run["cpu"] = time.process_time() - cpu
+    # ru_maxrss vem em KiB no Linux.
+    run["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    run["expanded"] = problem.succs if problem is not None else 0
+    run["generated"] = problem.states if problem is not None else 0
+    run["goal_tests"] = problem.goal_tests if problem is not None else 0
+    run["phases"] = dict(problem.phases if problem is not None else {}, parse=parse)
+    return run
+
+
+def summarize(runs):
+    """Totais por estratégia (procura/ramificação)."""
+    totals = {}
+    for run in runs:
+        key = "{}/{}".format(run["search"], run["branching"])
+        total = totals.setdefault(
+            key, {"runs": 0, "solved": 0, "timeouts": 0, "wall": 0.0, "cpu": 0.0,
+                  "expanded": 0, "peak_rss_kb": 0}
+        )
+        total["runs"] += 1
+        total["solved"] += run["status"] == "solved"
+        total["timeouts"] += run["status"] == "timeout"
+        total["wall"] += run["wall"]
+        total["cpu"] += run["cpu"]
+        total["expanded"] += run["expanded"]
+        total["peak_rss_kb"] = max(total["peak_rss_kb"], run["peak_rss_kb"])
+    return totals
+
+
+def git_commit():
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "HEAD"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+    except OSError:
+        return None
+    return output.stdout.decode().strip() or None
+
+
+def benchmark(paths, searches, branchings, timeout=None, repeat=1):
+    tasks = [
+        (path, search, branching, timeout)
+        for path in paths
+        for search in searches
+        for branching in branchings
+        for i in range(repeat)
+    ]
+    # Um processo novo por execução (maxtasksperchild=1), criado por fork
+    # para não pagar outra vez o arranque do interpretador.
+    context = multiprocessing.get_context("fork")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        runs = pool.map(measure, tasks, chunksize=1)
+
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timeout": timeout,
+        "runs": runs,
+        "summary": summarize(runs),
+    }
+
+
+def compare(before, after, stream=sys.stdout):
+    """Compara os totais por estratégia de dois ficheiros JSON."""
+    stream.write("{:<20} {:>12} {:>12} {:>8}\n".format("strategy", "before", "after", "ratio"))
+    for key, total in sorted(after["summary"].items()):
+        if key not in before["summary"]:
+            continue
+        old = before["summary"][key]["wall"]
+        new = total["wall"]
+        ratio = new / old if old else float("inf")
+        stream.write("{:<20} {:>11.3f}s {:>11.3f}s {:>7.2f}x\n".format(key, old, new, ratio))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mede o solver de Bimaru num corpus.")
+    parser.add_argument("paths", nargs="*", help="ficheiros, diretórios ou globs de .txt")
+    parser.add_argument("--search", nargs="+", choices=SEARCHES, default=["dfs"])
+    parser.add_argument("--branching", nargs="+", choices=Bimaru.BRANCHING,
+                        default=list(Bimaru.BRANCHING))
+    parser.add_argument("--timeout", type=float, help="limite em segundos por execução")
+    parser.add_argument("--repeat", type=int, default=1, help="execuções por combinação")
+    parser.add_argument("--output", help="ficheiro JSON (por omissão stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compara dois ficheiros JSON já gerados")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            compare(json.load(before), json.load(after))
+        return 0
+
+    if not args.paths:
+        sys.stderr.write("no instances given\n")
+        return 2
+
+    report = benchmark(instance_paths(args.paths), args.search, args.branching,
+                       args.timeout, args.repeat)
+    if args.output:
+        with open(args.output, "w") as stream:
+            json.dump(report, stream, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
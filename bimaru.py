@@ -6,61 +6,461 @@
 # 102604 Gonçalo Rua
 # 102611 João Gouveia
 
+import argparse
+import mmap
+import os
+import random
 import sys
-import copy
-from search import Problem, depth_first_tree_search
+import time
+from functools import lru_cache
+from search import (
+    Node,
+    Problem,
+    breadth_first_graph_search,
+    breadth_first_tree_search,
+    depth_first_graph_search,
+    depth_first_lazy_tree_search,
+    depth_first_tree_search,
+)
+
+# Classes de casa: "0" desconhecida, "." água, "x" parte de navio ainda sem
+# forma conhecida e as letras das partes de navio já colocadas.
+TILE_CLASSES = "0.xctblrm"
+
+# Passos de procura entre verificações dos limites de tempo e memória (solve).
+CHECK_INTERVAL = 64
+
+# Entradas guardadas por line_counts: a chave são os padrões de uma linha,
+# que num processo de lote longo não param de aparecer.
+LINE_COUNTS_CACHE = 1 << 16
+
+# Frota usada quando a instância não tem linha FLEET.
+DEFAULT_FLEET = [1, 1, 1, 1, 2, 2, 2, 3, 3, 4]
+
+# Vizinhos ortogonais (linha, coluna) que cada pista obriga a ser água e a
+# ser parte de navio.
+HINT_SHAPES = {
+    "c": (((-1, 0), (1, 0), (0, -1), (0, 1)), ()),
+    "t": (((-1, 0), (0, -1), (0, 1)), ((1, 0),)),
+    "b": (((1, 0), (0, -1), (0, 1)), ((-1, 0),)),
+    "l": (((0, -1), (-1, 0), (1, 0)), ((0, 1),)),
+    "r": (((0, 1), (-1, 0), (1, 0)), ((0, -1),)),
+    "m": ((), ()),
+}
+
+
+def bits(mask):
+    """Itera os índices dos bits a 1 de uma máscara."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def rect_mask(width, r0, c0, r1, c1):
+    """Máscara do retângulo [r0, r1] x [c0, c1] (inclusive)."""
+    line = ((1 << (c1 - c0 + 1)) - 1) << c0
+    mask = 0
+    for i in range(r0, r1 + 1):
+        mask |= line << (i * width)
+    return mask
+
+
+class Placement:
+    """Posição possível de um navio: casas ocupadas, halo de água à volta
+    e número de casas ocupadas em cada linha e coluna."""
+
+    __slots__ = ("index", "start", "end", "size", "mask", "halo", "parts", "rows", "cols")
+
+    def __init__(self, index, height, width, start, end):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.size = max(end[0] - start[0], end[1] - start[1]) + 1
+        self.mask = rect_mask(width, start[0], start[1], end[0], end[1])
+        self.halo = self.mask ^ rect_mask(
+            width,
+            max(start[0] - 1, 0),
+            max(start[1] - 1, 0),
+            min(end[0] + 1, height - 1),
+            min(end[1] + 1, width - 1),
+        )
+
+        first = self.mask & -self.mask
+        last = 1 << (self.mask.bit_length() - 1)
+        if self.size == 1:
+            self.parts = {"c": self.mask}
+        elif start[0] == end[0]:
+            self.parts = {"l": first, "m": self.mask ^ first ^ last, "r": last}
+        else:
+            self.parts = {"t": first, "m": self.mask ^ first ^ last, "b": last}
+
+        self.rows = [(i, end[1] - start[1] + 1) for i in range(start[0], end[0] + 1)]
+        self.cols = [(j, end[0] - start[0] + 1) for j in range(start[1], end[1] + 1)]
+
+    def __repr__(self):
+        return "<Placement {} {}>".format(self.start, self.end)
+
+
+def popcount(mask):
+    return bin(mask).count("1")
+
+
+@lru_cache(maxsize=None)
+def line_masks(height, width):
+    """Máscaras de cada linha e de cada coluna de uma grelha height x width."""
+    rows = tuple(rect_mask(width, i, 0, i, width - 1) for i in range(height))
+    cols = tuple(rect_mask(width, 0, j, height - 1, j) for j in range(width))
+    return rows, cols
+
+
+def diagonals(mask, height, width):
+    """Casas diagonalmente adjacentes a alguma casa de 'mask'."""
+    rows, cols = line_masks(height, width)
+    full = (1 << (height * width)) - 1
+    not_first = full ^ cols[0]
+    not_last = full ^ cols[-1]
+    return (
+        ((mask << (width + 1)) & not_first)
+        | ((mask << (width - 1)) & not_last)
+        | ((mask >> (width - 1)) & not_first)
+        | ((mask >> (width + 1)) & not_last)
+    ) & full
+
+
+def column_bits(mask, col, height, width):
+    """Bits da coluna 'col' de 'mask', compactados (bit i = linha i)."""
+    column = 0
+    for i in range(height):
+        column |= ((mask >> (i * width + col)) & 1) << i
+    return column
+
+
+@lru_cache(maxsize=LINE_COUNTS_CACHE)
+def line_counts(free, forced, length, sizes):
+    """Conjunto (bitset) de números de partes de navio que uma linha pode
+    ainda receber. 'free' são as casas que podem ter navio, 'forced' as que
+    têm de o ter e 'sizes' os tamanhos de navio restantes. Cada troço
+    contíguo de navio na linha é um navio deitado nela, com um tamanho de
+    'sizes', ou uma só casa de um navio que a atravessa."""
+    longest = max(sizes)
+    # pieces[k]: bitset de totais possíveis com o troço atual de tamanho k
+    pieces = {0: 1}
+    for t in range(length + 1):
+        closed = 0
+        for k, reach in pieces.items():
+            if k == 0 or k == 1 or k in sizes:
+                closed |= reach
+        if t == length:
+            return closed
+
+        bit = 1 << t
+        following = {}
+        if not forced & bit and closed:
+            following[0] = closed
+        if free & bit:
+            for k, reach in pieces.items():
+                if k < longest:
+                    following[k + 1] = following.get(k + 1, 0) | (reach << 1)
+        pieces = following
+        if not pieces:
+            return 0
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(cells):
+    """Chaves de Zobrist de 64 bits para cada classe de casa (exceto "0") e
+    cada casa. A semente é fixa para que o hash seja reprodutível."""
+    rng = random.Random(cells)
+    return {tile: [rng.getrandbits(64) for i in range(cells)] for tile in TILE_CLASSES[1:]}
+
+
+def zobrist_delta(old, new, cells):
+    """Diferença de hash entre dois dicionários de máscaras."""
+    keys = zobrist_keys(cells)
+    delta = 0
+    for tile, table in keys.items():
+        for index in bits(old[tile] ^ new[tile]):
+            delta ^= table[index]
+    return delta
+
+
+@lru_cache(maxsize=None)
+def water_rows(height, width):
+    """Tabuleiro só de água já com as mudanças de linha, como bytes."""
+    return (b"." * width + b"\n") * height
+
+
+@lru_cache(maxsize=None)
+def placement_table(height, width, size):
+    """Todas as posições de um navio de tamanho 'size' numa grelha
+    height x width. Calculada uma única vez por tamanho de tabuleiro."""
+    starts = [((i, j), (i, j + size - 1)) for i in range(height) for j in range(width - size + 1)]
+    if size != 1:
+        starts += [((i, j), (i + size - 1, j)) for j in range(width) for i in range(height - size + 1)]
+    return tuple(
+        Placement(index, height, width, start, end)
+        for index, (start, end) in enumerate(starts)
+    )
 
 
 class BimaruState:
     state_id = 0
 
-    def __init__(self, board):
+    def __init__(self, board, floors=None, zobrist=None, open_lines=None, open_hints=None):
         self.board = board
+        # Modo "ship": índice abaixo do qual já não há navios de cada tamanho.
+        self.floors = floors if floors is not None else {}
+        if zobrist is None:
+            empty = dict.fromkeys(TILE_CLASSES, 0)
+            zobrist = zobrist_delta(empty, board.masks, board.height * board.width)
+        self.zobrist = zobrist
+        # Linhas/colunas com contagem por cumprir e pistas de navio por
+        # cobrir, mantidas por Bimaru.place para o goal_test ser O(1).
+        if open_lines is None:
+            open_lines = sum(1 for count in board.rows + board.cols if count)
+        if open_hints is None:
+            open_hints = popcount(board.hint_ships() & (board.masks["0"] | board.masks["x"]))
+        self.open_lines = open_lines
+        self.open_hints = open_hints
         self.id = BimaruState.state_id
         BimaruState.state_id += 1
 
     def __lt__(self, other):
         return self.id < other.id
 
-    def __str__(self) -> str:
-        tiles = copy.deepcopy(self.board.tiles)
-        for hint in self.board.hints:
-            tiles[hint[0]][hint[1]] = hint[2].upper()
+    def __eq__(self, other):
+        return (
+            isinstance(other, BimaruState)
+            and self.zobrist == other.zobrist
+            and self.board.masks == other.board.masks
+            and self.floors == other.floors
+        )
 
-        return "\n".join(map("".join, tiles))
+    def __hash__(self):
+        return self.zobrist
+
+    def __str__(self) -> str:
+        board = self.board
+        buffer = bytearray(board.height * (board.width + 1))
+        board.render_into(buffer)
+        return buffer[:-1].decode()
 
 
 class Board:
-    """Representação interna de um tabuleiro de Bimaru."""
+    """Representação interna de um tabuleiro de Bimaru.
 
-    def __init__(self, cols, rows, tiles, hints, ships):
+    Cada classe de casa é guardada como uma máscara de bits sobre a grelha
+    (bit i * width + j para a casa (i, j)), em self.masks."""
+
+    def __init__(self, cols, rows, masks, hints, ships):
         self.cols = cols
         self.rows = rows
-        self.tiles = tiles
+        self.masks = masks
         self.hints = hints
         self.ships = ships
-        self.fill_blocked()
+        self.height = len(rows)
+        self.width = len(cols)
+        self.dead = False
+        self.propagate()
+
+    @property
+    def tiles(self):
+        tiles = [["0"] * self.width for i in range(self.height)]
+        for tile, mask in self.masks.items():
+            for index in bits(mask):
+                tiles[index // self.width][index % self.width] = tile
+        return tiles
+
+    def render_into(self, buffer, offset=0):
+        """Escreve o tabuleiro em 'buffer' a partir de 'offset', uma linha por
+        fila terminada em "\\n", com as pistas em maiúsculas. Retorna o
+        offset a seguir ao tabuleiro."""
+        width = self.width
+        end = offset + self.height * (width + 1)
+        # Parte de um tabuleiro só de água e escreve por cima as outras casas.
+        buffer[offset:end] = water_rows(self.height, width)
+        for tile, mask in self.masks.items():
+            if tile == "." or not mask:
+                continue
+            code = ord(tile)
+            for index in bits(mask):
+                buffer[offset + index + index // width] = code
+        for row, col, hint in self.hints:
+            buffer[offset + row * (width + 1) + col] = ord(hint.upper())
+        return end
+
+    def bit(self, row: int, col: int):
+        return 1 << (row * self.width + col)
+
+    def hint_ships(self):
+        """Máscara das casas com pistas de partes de navio."""
+        mask = 0
+        for row, col, hint in self.hints:
+            if hint != "w":
+                mask |= self.bit(row, col)
+        return mask
+
+    def neighbour(self, row: int, col: int, offset):
+        """Bit da casa vizinha na direção 'offset', ou None fora da grelha."""
+        i = row + offset[0]
+        j = col + offset[1]
+        if 0 <= i < self.height and 0 <= j < self.width:
+            return self.bit(i, j)
+        return None
+
+    def fill_water(self, mask) -> bool:
+        masks = self.masks
+        if mask & ~(masks["0"] | masks["."]):
+            self.dead = True
+        mask &= masks["0"]
+        masks["0"] ^= mask
+        masks["."] |= mask
+        return mask != 0
+
+    def fill_ship(self, mask) -> bool:
+        masks = self.masks
+        if mask & masks["."]:
+            self.dead = True
+        mask &= masks["0"]
+        masks["0"] ^= mask
+        masks["x"] |= mask
+        return mask != 0
+
+    def apply_hints(self):
+        """Marca as casas das pistas e os vizinhos que a sua forma obriga."""
+        for row, col, hint in self.hints:
+            if hint == "w":
+                self.fill_water(self.bit(row, col))
+                continue
+
+            self.fill_ship(self.bit(row, col))
+            water, ship = HINT_SHAPES[hint]
+            for offset in water:
+                bit = self.neighbour(row, col, offset)
+                if bit is not None:
+                    self.fill_water(bit)
+            for offset in ship:
+                bit = self.neighbour(row, col, offset)
+                if bit is None:
+                    self.dead = True
+                else:
+                    self.fill_ship(bit)
+        self.propagate()
+
+    def propagate(self):
+        """Aplica as deduções do Bimaru até o tabuleiro deixar de mudar ou
+        se chegar a uma contradição (self.dead)."""
+        changed = True
+        while changed and not self.dead:
+            changed = self.propagate_lines()
+            changed |= self.propagate_diagonals()
+            changed |= self.propagate_middles()
+
+        if not self.dead and self.ships and not self.lines_feasible():
+            self.dead = True
+
+    def lines_feasible(self) -> bool:
+        """Verifica, com line_counts, se cada linha e coluna ainda pode
+        receber as partes de navio que lhe faltam com as casas livres e
+        os navios restantes."""
+        forced = self.masks["x"]
+        free = self.masks["0"] | forced
+        sizes = frozenset(self.ships)
+        width = self.width
+        height = self.height
+        row_full = (1 << width) - 1
+        for i, count in enumerate(self.rows):
+            if count:
+                shift = i * width
+                reach = line_counts(
+                    (free >> shift) & row_full,
+                    (forced >> shift) & row_full,
+                    width,
+                    sizes,
+                )
+                if not reach >> count & 1:
+                    return False
+
+        for j, count in enumerate(self.cols):
+            if count:
+                reach = line_counts(
+                    column_bits(free, j, height, width),
+                    column_bits(forced, j, height, width),
+                    height,
+                    sizes,
+                )
+                if not reach >> count & 1:
+                    return False
+        return True
+
+    def propagate_lines(self) -> bool:
+        """Uma linha ou coluna que já tem todas as partes de navio fica com
+        o resto a água; uma que precisa de todas as casas livres fica com
+        elas como partes de navio."""
+        masks = self.masks
+        row_masks, col_masks = line_masks(self.height, self.width)
+        changed = False
+        for counts, lines in ((self.rows, row_masks), (self.cols, col_masks)):
+            for count, line in zip(counts, lines):
+                unknown = masks["0"] & line
+                forced = popcount(masks["x"] & line)
+                free = popcount(unknown)
+                if count < forced or count > forced + free:
+                    self.dead = True
+                    return False
+                if not unknown:
+                    continue
+                if count == forced:
+                    changed |= self.fill_water(unknown)
+                elif count == forced + free:
+                    changed |= self.fill_ship(unknown)
+        return changed
 
-    def fill_row(self, row: int):
-        for j in range(10):
-            if self.tiles[row][j] == "0":
-                self.tiles[row][j] = "."
+    def propagate_diagonals(self) -> bool:
+        forced = self.masks["x"]
+        diagonal = diagonals(forced, self.height, self.width)
+        if diagonal & forced:
+            self.dead = True
+            return False
+        return self.fill_water(diagonal)
 
-    def fill_col(self, col: int):
-        for i in range(10):
-            if self.tiles[i][col] == "0":
-                self.tiles[i][col] = "."
+    def propagate_middles(self) -> bool:
+        """Uma pista 'm' por cobrir é horizontal se tiver água (ou o bordo)
+        em cima ou em baixo, ou navio à esquerda ou à direita, e vice-versa."""
+        masks = self.masks
+        water = masks["."]
+        ship = masks["0"] ^ water ^ ((1 << (self.height * self.width)) - 1)
+        changed = False
+        for row, col, hint in self.hints:
+            if hint != "m" or not self.bit(row, col) & masks["x"]:
+                continue
 
-    def fill_blocked(self):
-        for i in range(10):
-            if self.cols[i] == 0:
-                self.fill_col(i)
+            up, down, left, right = (
+                self.neighbour(row, col, offset)
+                for offset in ((-1, 0), (1, 0), (0, -1), (0, 1))
+            )
+            vertical_blocked = any(bit is None or bit & water for bit in (up, down))
+            horizontal_blocked = any(bit is None or bit & water for bit in (left, right))
+            if vertical_blocked or any(bit and bit & ship for bit in (left, right)):
+                ends, sides = (left, right), (up, down)
+            elif horizontal_blocked or any(bit and bit & ship for bit in (up, down)):
+                ends, sides = (up, down), (left, right)
+            else:
+                continue
 
-            if self.rows[i] == 0:
-                self.fill_row(i)
+            for bit in sides:
+                if bit is not None:
+                    changed |= self.fill_water(bit)
+            for bit in ends:
+                if bit is None:
+                    self.dead = True
+                    return False
+                changed |= self.fill_ship(bit)
+        return changed
 
     @staticmethod
-    def parse_instance():
+    def parse_instance(stream=None):
         """Lê o test do standard input (stdin) que é passado como argumento
         e retorna uma instância da classe Board.
 
@@ -70,259 +470,697 @@ class Board:
             > from sys import stdin
             > line = stdin.readline().split()
         """
-        lines = sys.stdin.readlines()
-        rows = list(map(int, lines[0].split()[1:]))
-        cols = list(map(int, lines[1].split()[1:]))
-        tiles = [["0"] * 10 for i in range(10)]
+        if stream is None:
+            stream = sys.stdin
+        return Board.from_lines(stream.readlines())
+
+    @staticmethod
+    def from_lines(lines):
+        """Constrói o tabuleiro a partir das linhas de uma instância. O tamanho
+        da grelha vem do número de valores em ROW e COLUMN. Uma linha
+        opcional "FLEET 4 3 3 2 ..." dá os tamanhos dos navios; sem ela é
+        usada a frota clássica (DEFAULT_FLEET)."""
+        rows = cols = None
+        ships = DEFAULT_FLEET
         hints = []
-        for line in lines[3:]:
-            components = line.split()[1:]
-            new_tuple = (int(components[0]), int(components[1]), components[2].lower())
-            hints.append(new_tuple)
+        for line in lines:
+            components = line.split()
+            if not components:
+                continue
+            keyword = components[0].upper()
+            if keyword == "ROW":
+                rows = list(map(int, components[1:]))
+            elif keyword == "COLUMN":
+                cols = list(map(int, components[1:]))
+            elif keyword == "FLEET":
+                ships = list(map(int, components[1:]))
+            elif keyword == "HINT":
+                hints.append((int(components[1]), int(components[2]), components[3].lower()))
 
-        ships = [1, 1, 1, 1, 2, 2, 2, 3, 3, 4]
-        return Board(cols, rows, tiles, hints, ships)
+        if rows is None or cols is None:
+            raise ValueError("instance without ROW or COLUMN line")
+        if ships and max(ships) > max(len(rows), len(cols)):
+            raise ValueError("ship longer than the board")
 
+        masks = dict.fromkeys(TILE_CLASSES, 0)
+        masks["0"] = (1 << (len(rows) * len(cols))) - 1
+        board = Board(cols, rows, masks, hints, sorted(ships))
+        board.apply_hints()
+        return board
 
-class Bimaru(Problem):
-    def __init__(self, board: Board):
-        """O construtor especifica o estado inicial."""
-        super().__init__(BimaruState(board))
 
-    def get_combinations(self, lst, size):
-        if size == 0 or len(lst) < size:
-            return []
+def split_instances(lines):
+    """Separa um stream com várias instâncias seguidas, gerando as linhas de
+    cada uma à medida que são lidas. Cada instância termina na última pista
+    anunciada pela sua linha de contagem, ou quando começa outra (linha ROW).
+    Linhas vazias, "---" e comentários "#" entre instâncias são ignorados."""
+    current = []
+    hints_left = None
+    for line in lines:
+        components = line.split()
+        if not components or components[0].startswith(("#", "---")):
+            continue
+
+        keyword = components[0].upper()
+        if keyword == "ROW" and current:
+            yield current
+            current = []
+            hints_left = None
+
+        current.append(line)
+        if keyword.isdigit():
+            hints_left = int(keyword)
+        elif keyword == "HINT" and hints_left is not None:
+            hints_left -= 1
+        if hints_left == 0:
+            yield current
+            current = []
+            hints_left = None
+    if current:
+        yield current
 
-        combinations = []
-        self.generate_combinations(lst, size, 0, [], combinations)
-        return combinations
 
-    def generate_combinations(
-        self, lst, size, start, current_combination, combinations
-    ):
-        if size == 0:
-            combinations.append(current_combination.copy())
+def stream_lines(path):
+    """Linhas de um ficheiro, lidas de um mapeamento em memória (mmap) para
+    que ficheiros grandes não sejam carregados de uma vez. "-" é o stdin."""
+    if path == "-":
+        yield from sys.stdin
+        return
+
+    with open(path, "rb") as stream:
+        if os.fstat(stream.fileno()).st_size == 0:
             return
+        with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for line in iter(mapped.readline, b""):
+                yield line.decode()
 
-        for i in range(start, len(lst)):
-            current_combination.append(lst[i])
-            self.generate_combinations(
-                lst, size - 1, i + 1, current_combination, combinations
-            )
-            current_combination.pop()
 
-    def overlap(self, ship1, ship2) -> bool:
-        ship1_area = (
-            (max(ship1[0][0] - 1, 0), max(ship1[0][1] - 1, 0)),
-            (min(ship1[1][0] + 1, 9), min(ship1[1][1] + 1, 9)),
-        )
+def read_instances(path):
+    """Gera um Board de cada vez a partir de um ficheiro com várias instâncias."""
+    for lines in split_instances(stream_lines(path)):
+        yield Board.from_lines(lines)
 
-        ship2_area = ((ship2[0][0], ship2[0][1]), (ship2[1][0], ship2[1][1]))
 
-        if ship1_area[1][0] < ship2_area[0][0] or ship1_area[0][0] > ship2_area[1][0]:
-            return False
-        if ship1_area[1][1] < ship2_area[0][1] or ship1_area[0][1] > ship2_area[1][1]:
-            return False
+class SolutionWriter:
+    """Escreve soluções em 'stream' em blocos: cada tabuleiro é desenhado
+    diretamente num buffer partilhado (Board.render_into) e o buffer só é
+    escrito, de uma vez, quando tem 'batch' soluções ou no flush. 'stream'
+    é um ficheiro binário ou um stream de texto com .buffer (sys.stdout)."""
 
-        return True
+    def __init__(self, stream=None, batch=256):
+        self.text = stream if stream is not None else sys.stdout
+        # Nos streams de texto escreve-se diretamente no buffer binário.
+        self.stream = getattr(self.text, "buffer", self.text)
+        self.batch = batch
+        self.buffer = bytearray()
+        self.offset = 0
+        self.pending = 0
 
-    def remove_incompatible(self, state, actions):
-        possible_actions = []
-        for action in actions:
-            compatible = True
-
-            action_size = len(action)
-            for i in range(action_size - 1):
-                for j in range(i + 1, action_size):
-                    if self.overlap(action[i], action[j]):
-                        compatible = False
-                        break
-                if not compatible:
-                    break
-
-            if not compatible:
-                continue
+    def write(self, state):
+        board = state.board
+        end = self.offset + board.height * (board.width + 1)
+        if end > len(self.buffer):
+            self.buffer.extend(bytes(max(end - len(self.buffer), len(self.buffer))))
+        self.offset = board.render_into(self.buffer, self.offset)
+        self.pending += 1
+        if self.pending >= self.batch:
+            self.flush()
+
+    def write_text(self, text):
+        """Acrescenta texto já formatado (uma solução em str, um cabeçalho)."""
+        data = text.encode()
+        self.buffer[self.offset : self.offset + len(data)] = data
+        self.offset += len(data)
+        self.pending += 1
+        if self.pending >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self.offset:
+            # O texto já escrito em self.text tem de sair antes.
+            if self.text is not self.stream:
+                self.text.flush()
+            with memoryview(self.buffer) as view:
+                self.stream.write(view[: self.offset])
+        self.stream.flush()
+        self.offset = 0
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Interrupted(Exception):
+    """Lançada a meio de Bimaru.actions quando Bimaru.interrupt o pede."""
 
-            rows = state.board.rows.copy()
-            cols = state.board.cols.copy()
-            for ship in action:
-                start = ship[0]
-                end = ship[1]
-                if start[0] == end[0] and start[1] == end[1]:
-                    rows[start[0]] -= 1
-                    cols[start[1]] -= 1
-                elif start[0] == end[0]:
-                    rows[start[0]] -= end[1] - start[1] + 1
-                    for i in range(start[1], end[1] + 1):
-                        cols[i] -= 1
-                elif start[1] == end[1]:
-                    cols[start[1]] -= end[0] - start[0] + 1
-                    for i in range(start[0], end[0] + 1):
-                        rows[i] -= 1
-
-            for i in range(10):
-                if rows[i] < 0 or cols[i] < 0:
-                    compatible = False
-                    break
-
-            if not compatible:
+
+class Bimaru(Problem):
+    # "fleet": cada ação coloca todos os navios do maior tamanho restante.
+    # "ship": cada ação coloca um navio, escolhido por MRV.
+    BRANCHING = ("fleet", "ship")
+
+    # Função sem argumentos consultada a cada CHECK_INTERVAL passos da
+    # geração de combinações; se retornar True, é lançado Interrupted.
+    interrupt = None
+
+    def __init__(self, board: Board, branching="fleet"):
+        """O construtor especifica o estado inicial."""
+        if branching not in self.BRANCHING:
+            raise ValueError("unknown branching mode: {}".format(branching))
+        super().__init__(BimaruState(board))
+        self.height = board.height
+        self.width = board.width
+        self.branching = branching
+        self.hint_ships = board.hint_ships()
+        self.table = {size: self.anchored(board, size) for size in set(board.ships)}
+
+    def anchored(self, board: Board, size):
+        """Posições de tamanho 'size' compatíveis com as pistas: uma pista
+        só pode ser coberta pela parte de navio com a sua letra, e nenhuma
+        pista de navio pode ficar no halo de um navio."""
+        hint_ships = board.hint_ships()
+        hint_water = 0
+        letters = {}
+        for row, col, hint in board.hints:
+            bit = board.bit(row, col)
+            if hint == "w":
+                hint_water |= bit
+            else:
+                letters[hint] = letters.get(hint, 0) | bit
+
+        anchored = []
+        for ship in placement_table(self.height, self.width, size):
+            if ship.mask & hint_water or ship.halo & hint_ships:
                 continue
+            if any(
+                ship.mask & mask & ~ship.parts.get(hint, 0)
+                for hint, mask in letters.items()
+            ):
+                continue
+            anchored.append(ship)
+        return tuple(anchored)
 
-            possible_actions.append(action)
+    def combinations(self, candidates, amount, rows, cols):
+        """Gera as combinações de 'amount' navios de 'candidates' que não se
+        tocam e cabem nas contagens de linhas e colunas. Um prefixo
+        inválido é cortado logo que é construído."""
+        rows = rows.copy()
+        cols = cols.copy()
+        chosen = []
+        interrupt = self.interrupt
+        steps = 0
 
-        return possible_actions
+        def extend(start, blocked):
+            nonlocal steps
+            if interrupt is not None:
+                steps += 1
+                if not steps % CHECK_INTERVAL and interrupt():
+                    raise Interrupted()
+            if len(chosen) == amount:
+                yield tuple(chosen)
+                return
 
-    def actions(self, state: BimaruState):
-        """Retorna uma lista de ações que podem ser executadas a
-        partir do estado passado como argumento."""
-        actions = []
+            for k in range(start, len(candidates) - amount + len(chosen) + 1):
+                ship = candidates[k]
+                if ship.mask & blocked:
+                    continue
+                if any(rows[i] < count for i, count in ship.rows):
+                    continue
+                if any(cols[j] < count for j, count in ship.cols):
+                    continue
 
+                for i, count in ship.rows:
+                    rows[i] -= count
+                for j, count in ship.cols:
+                    cols[j] -= count
+                chosen.append(ship)
+
+                yield from extend(k + 1, blocked | ship.mask | ship.halo)
+
+                chosen.pop()
+                for i, count in ship.rows:
+                    rows[i] += count
+                for j, count in ship.cols:
+                    cols[j] += count
+
+        return extend(0, 0)
+
+    def candidates(self, board: Board, size, floor=-1):
+        """Posições de um navio de tamanho 'size' compatíveis com o
+        tabuleiro, com índice acima de 'floor'."""
+        forced = board.masks["x"]
+        free = board.masks["0"] | forced
+        rows = board.rows
+        cols = board.cols
+        candidates = []
+        for ship in self.table[size]:
+            if ship.index <= floor:
+                continue
+            if ship.mask & free != ship.mask or ship.halo & forced:
+                continue
+            if any(rows[i] < count for i, count in ship.rows):
+                continue
+            if any(cols[j] < count for j, count in ship.cols):
+                continue
+            candidates.append(ship)
+        return candidates
+
+    def actions(self, state: BimaruState):
+        """Retorna as ações que podem ser executadas a partir do estado
+        passado como argumento. As combinações são geradas à medida que
+        são pedidas."""
         board = state.board
-        tiles = board.tiles
         ships = board.ships
-        if not ships:
+        if not ships or board.dead:
+            return []
+
+        if self.branching == "ship":
+            return self.ship_actions(state)
+
+        by_size = {size: self.candidates(board, size) for size in set(ships)}
+        if not self.coverable(board, by_size):
             return []
 
         target_size = max(ships)
         ship_amount = ships.count(target_size)
+        candidates = by_size[target_size]
+        return self.combinations(candidates, ship_amount, board.rows, board.cols)
+
+    def coverable(self, board: Board, by_size) -> bool:
+        """Verifica se todas as partes de navio por cobrir (as pistas
+        incluídas) podem ainda ser cobertas por algum navio restante."""
+        reach = 0
+        for candidates in by_size.values():
+            for ship in candidates:
+                reach |= ship.mask
+        return not board.masks["x"] & ~reach
+
+    def ship_actions(self, state: BimaruState):
+        """Ramifica num só navio: escolhe o tamanho restante, ou a parte de
+        navio por cobrir, com menos posições possíveis (MRV). Navios do
+        mesmo tamanho são colocados por ordem crescente de índice, para não
+        explorar permutações. Cada ação é um par (posição, menor), em que
+        'menor' indica que a posição é a de menor índice do seu tamanho."""
+        board = state.board
+        forced = board.masks["x"]
+
+        by_size = {
+            size: self.candidates(board, size, state.floors.get(size, -1))
+            for size in set(board.ships)
+        }
+        size, best = min(by_size.items(), key=lambda item: len(item[1]))
+        if not best:
+            return []
 
-        for hint in state.board.hints:
-            if hint[2] == "w":
-                if tiles[hint[0]][hint[1]] != "." and tiles[hint[0]][hint[1]] != "0":
-                    return []
-            elif tiles[hint[0]][hint[1]] != hint[2] and tiles[hint[0]][hint[1]] != "0":
+        covering = {}
+        for candidates in by_size.values():
+            for ship in candidates:
+                for index in bits(ship.mask & forced):
+                    covering.setdefault(index, []).append(ship)
+        for index in bits(forced):
+            if index not in covering:
                 return []
 
-        # linhas
-        for i in range(10):
-            for j in range(10):
-                if tiles[i][j] == "0":
-                    k = j
-                    size = 1
-                    while k < 10 and tiles[i][k] == "0" and size <= target_size:
-                        not_wanted = [
-                            (i, k, "w"),
-                            (i, k, "c"),
-                            (i, k, "t"),
-                            (i, k, "b"),
-                        ]
-                        if (i, k, tiles[i][k]) in not_wanted:
-                            break
-                        if size <= board.rows[i] and size == target_size:
-                            actions.append(((i, j), (i, k)))
-                        size += 1
-                        k += 1
-
-        # colunas
-        if target_size != 1:
-            for i in range(10):
-                for j in range(10):
-                    if tiles[j][i] == "0":
-                        k = j
-                        size = 1
-                        while k < 10 and tiles[k][i] == "0" and size <= target_size:
-                            not_wanted = [
-                                (i, k, "w"),
-                                (i, k, "c"),
-                                (i, k, "l"),
-                                (i, k, "r"),
-                            ]
-                            if (k, i, tiles[k][i]) in not_wanted:
-                                break
-                            if size <= board.cols[i] and size == target_size:
-                                actions.append(((j, i), (k, i)))
-                            size += 1
-                            k += 1
-
-        combinations = self.get_combinations(actions, ship_amount)
-        useful_actions = self.remove_incompatible(state, combinations)
-
-        return useful_actions
-
-    def fill_ship_area(self, tiles, action):
-        start = action[0]
-        end = action[1]
-
-        min_col = max(start[1] - 1, 0)
-        min_row = max(start[0] - 1, 0)
-        max_col = min(end[1] + 1, 9)
-        max_row = min(end[0] + 1, 9)
-
-        for i in range(min_row, max_row + 1):
-            for j in range(min_col, max_col + 1):
-                tiles[i][j] = "."
+        if covering:
+            cell = min(covering, key=lambda index: len(covering[index]))
+            if len(covering[cell]) <= len(best):
+                return [(ship, False) for ship in covering[cell]]
+
+        return [(ship, True) for ship in best]
 
     def result(self, state: BimaruState, action):
         """Retorna o estado resultante de executar a 'action' sobre
         'state' passado como argumento. A ação a executar deve ser uma
         das presentes na lista obtida pela execução de
         self.actions(state)."""
+        floors = state.floors
+        if self.branching == "ship":
+            ship, lowest = action
+            if lowest:
+                floors = dict(floors)
+                floors[ship.size] = ship.index
+            action = (ship,)
+
+        return self.place(state, action, floors)
+
+    def place(self, state: BimaruState, ships, floors=None):
+        """Estado resultante de colocar os navios 'ships' (Placements)."""
         board = state.board
 
-        tiles = copy.deepcopy(board.tiles)
+        masks = board.masks.copy()
         rows = board.rows.copy()
         cols = board.cols.copy()
-        ships = board.ships.copy()
-
-        for ship in action:
-            start = ship[0]
-            end = ship[1]
-            self.fill_ship_area(tiles, ship)
-
-            if start[0] == end[0] and start[1] == end[1]:
-                tiles[start[0]][start[1]] = "c"
-                rows[start[0]] -= 1
-                cols[start[1]] -= 1
-                ships.remove(1)
-            elif start[0] == end[0]:
-                tiles[start[0]][start[1]] = "l"
-                for j in range(start[1] + 1, end[1]):
-                    tiles[start[0]][j] = "m"
-                tiles[end[0]][end[1]] = "r"
-
-                rows[start[0]] -= end[1] - start[1] + 1
-                for i in range(start[1], end[1] + 1):
-                    cols[i] -= 1
-                ships.remove(end[1] - start[1] + 1)
-            elif start[1] == end[1]:
-                tiles[start[0]][start[1]] = "t"
-                for i in range(start[0] + 1, end[0]):
-                    tiles[i][start[1]] = "m"
-                tiles[end[0]][end[1]] = "b"
-
-                for i in range(start[0], end[0] + 1):
-                    rows[i] -= 1
-                cols[start[1]] -= end[0] - start[0] + 1
-                ships.remove(end[0] - start[0] + 1)
-
-        new_board = Board(cols, rows, tiles, board.hints, ships)
-        return BimaruState(new_board)
+        remaining = board.ships.copy()
+        open_lines = state.open_lines
+        open_hints = state.open_hints
+
+        for ship in ships:
+            masks["0"] &= ~(ship.mask | ship.halo)
+            masks["x"] &= ~ship.mask
+            masks["."] |= ship.halo
+            for part, mask in ship.parts.items():
+                masks[part] |= mask
+
+            for i, count in ship.rows:
+                rows[i] -= count
+                if not rows[i]:
+                    open_lines -= 1
+            for j, count in ship.cols:
+                cols[j] -= count
+                if not cols[j]:
+                    open_lines -= 1
+            remaining.remove(ship.size)
+            if ship.mask & self.hint_ships:
+                open_hints -= popcount(ship.mask & self.hint_ships)
+
+        new_board = Board(cols, rows, masks, board.hints, remaining)
+        zobrist = state.zobrist ^ zobrist_delta(
+            board.masks, new_board.masks, self.height * self.width
+        )
+        if floors is None:
+            floors = state.floors
+        return BimaruState(new_board, floors, zobrist, open_lines, open_hints)
 
     def goal_test(self, state: BimaruState):
         """Retorna True se e só se o estado passado como argumento é
         um estado objetivo. Deve verificar se todas as posições do tabuleiro
-        estão preenchidas de acordo com as regras do problema."""
+        estão preenchidas de acordo com as regras do problema.
+
+        As pistas de água ficam a água desde Board.apply_hints e as posições
+        só cobrem pistas com a letra certa (Bimaru.anchored), por isso basta
+        olhar para os contadores mantidos em Bimaru.place."""
         board = state.board
-        tiles = board.tiles
-        hints = board.hints
+        return (
+            not state.open_lines
+            and not state.open_hints
+            and not board.ships
+            and not board.masks["x"]
+            and not board.dead
+        )
 
-        for i in range(10):
-            if state.board.rows[i] != 0 or state.board.cols[i] != 0:
-                return False
 
-        for hint in hints:
-            if hint[2] == "w":
-                if tiles[hint[0]][hint[1]] != "." and tiles[hint[0]][hint[1]] != "0":
-                    return False
-            elif tiles[hint[0]][hint[1]] != hint[2]:
-                return False
+def memory_usage():
+    """Memória residente atual do processo em bytes (/proc/self/statm), ou o
+    pico (ru_maxrss) onde não há /proc."""
+    try:
+        with open("/proc/self/statm") as stream:
+            return int(stream.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        # ru_maxrss vem em KiB no Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def solve(problem, timeout=None, deadline=None, max_nodes=None, max_memory=None):
+    """Procura em profundidade, pela ordem de depth_first_lazy_tree_search,
+    que pára por si quando passa um limite: 'timeout' em segundos ou
+    'deadline' (instante de time.monotonic()), 'max_nodes' nós expandidos ou
+    'max_memory' bytes de memória residente. Os limites de tempo e memória
+    são também verificados enquanto as ações de um nó são geradas (ver
+    Bimaru.interrupt). Retorna um dicionário com:
+        status   "solved", "unsolvable", "timeout" ou "exhausted" (nós ou
+                 memória, indicado em "limit");
+        state    o estado objetivo, ou None;
+        nodes    os nós expandidos;
+        deepest  o estado com mais navios colocados a que se chegou;
+        time     os segundos gastos."""
+    start = time.monotonic()
+    if timeout is not None:
+        deadline = min(deadline, start + timeout) if deadline is not None else start + timeout
+    stopped = None
+
+    def interrupt():
+        nonlocal stopped
+        if deadline is not None and time.monotonic() >= deadline:
+            stopped = "deadline"
+        elif max_memory is not None and memory_usage() >= max_memory:
+            stopped = "memory"
+        return stopped is not None
+
+    def result(status, state=None, limit=None):
+        return {
+            "status": status,
+            "limit": limit,
+            "state": state,
+            "nodes": nodes,
+            "deepest": deepest,
+            "time": time.monotonic() - start,
+        }
+
+    # Um InstrumentedProblem delega em .problem: o gancho vai para o Bimaru.
+    bimaru = problem
+    while not isinstance(bimaru, Bimaru):
+        bimaru = bimaru.problem
+    previous = bimaru.interrupt
+    bimaru.interrupt = interrupt
+
+    nodes = 0
+    deepest = problem.initial
+    try:
+        if problem.goal_test(deepest):
+            return result("solved", deepest)
+        frontier = [(problem.initial, iter(problem.actions(problem.initial)))]
+        nodes += 1
+        while frontier:
+            state, actions = frontier[-1]
+            for action in actions:
+                break
+            else:
+                frontier.pop()
+                continue
+
+            child = problem.result(state, action)
+            if len(child.board.ships) < len(deepest.board.ships):
+                deepest = child
+            if problem.goal_test(child):
+                return result("solved", child)
+
+            if max_nodes is not None and nodes >= max_nodes:
+                return result("exhausted", limit="nodes")
+            if not nodes % CHECK_INTERVAL and interrupt():
+                break
+            frontier.append((child, iter(problem.actions(child))))
+            nodes += 1
+        else:
+            return result("unsolvable")
+    except Interrupted:
+        pass
+    finally:
+        bimaru.interrupt = previous
+    return result("timeout" if stopped == "deadline" else "exhausted", limit=stopped)
+
+
+def subproblem_key(state: BimaruState):
+    """O que resta resolver num estado: casas desconhecidas e partes de navio
+    por cobrir, contagens, frota e limites restantes. Dois estados com a
+    mesma chave têm as mesmas continuações até um objetivo, mesmo que os
+    navios já colocados sejam outros."""
+    board = state.board
+    return (
+        board.masks["0"],
+        board.masks["x"],
+        tuple(board.rows),
+        tuple(board.cols),
+        tuple(board.ships),
+        tuple(sorted(state.floors.items())),
+        board.dead,
+    )
 
-        return not board.ships
+
+def count_solutions(problem, limit=None, solutions=None):
+    """Conta os estados objetivo de 'problem' percorrendo toda a árvore de
+    procura. A contagem de cada subproblema já resolvido fica em memória,
+    indexada por subproblem_key, e não é explorada outra vez. Com 'limit'
+    a contagem pára assim que o atinge; os estados objetivo encontrados são
+    acrescentados a 'solutions', se for dada uma lista. Para isso a memória
+    guarda também as continuações (sequências de ações) de cada
+    subproblema, até 'limit', que são refeitas a partir do estado atual."""
+    memo = {}
+    total = 0
+    keep = solutions is not None
+
+    def replay(state, path):
+        for action in path:
+            state = problem.result(state, action)
+        return state
+
+    def count(state):
+        """Retorna (número de objetivos abaixo de 'state', continuações)."""
+        nonlocal total
+        if problem.goal_test(state):
+            total += 1
+            if keep:
+                solutions.append(state)
+            return 1, [()]
+        key = subproblem_key(state)
+        known = memo.get(key)
+        if known is not None:
+            subtotal, paths = known
+            if limit is not None:
+                paths = paths[: limit - total]
+                subtotal = min(subtotal, limit - total)
+            total += subtotal
+            if keep:
+                solutions.extend(replay(state, path) for path in paths)
+            return subtotal, paths
+
+        subtotal = 0
+        paths = []
+        for action in problem.actions(state):
+            child_total, child_paths = count(problem.result(state, action))
+            subtotal += child_total
+            if keep:
+                room = len(child_paths) if limit is None else limit - len(paths)
+                paths += [(action,) + path for path in child_paths[:room]]
+            if limit is not None and total >= limit:
+                # Contagem parcial: não pode ficar na memória.
+                return subtotal, paths
+        memo[key] = (subtotal, paths)
+        return subtotal, paths
+
+    count(problem.initial)
+    return total
+
+
+def is_unique(problem):
+    """True se 'problem' tem exatamente uma solução. Pára na segunda."""
+    return count_solutions(problem, limit=2) == 1
+
+
+def depth_first_trail_search(problem):
+    """Procura em profundidade em árvore sem nós com ponteiro para o pai. A
+    pilha só guarda pares (profundidade, ação) e ficam vivos apenas os
+    estados do caminho atual, um por nível, com o rasto das ações que os
+    geraram: cada estado é construído quando o seu par sai da pilha e
+    libertado quando a procura volta acima do seu nível. O Node devolvido é
+    reconstruído a partir do rasto."""
+    states = [problem.initial]
+    trail = []
+    stack = [(0, None)]
+    while stack:
+        depth, action = stack.pop()
+        if depth:
+            del states[depth:]
+            del trail[depth - 1 :]
+            states.append(problem.result(states[-1], action))
+            trail.append(action)
+
+        state = states[-1]
+        if problem.goal_test(state):
+            node = Node(problem.initial)
+            for action, child in zip(trail, states[1:]):
+                cost = problem.path_cost(node.path_cost, node.state, action, child)
+                node = Node(child, node, action, cost)
+            return node
+        stack.extend((depth + 1, action) for action in problem.actions(state))
+    return None
+
+
+SEARCHES = {
+    "dfs": depth_first_tree_search,
+    "dfs-graph": depth_first_graph_search,
+    "dfs-lazy": depth_first_lazy_tree_search,
+    "dfs-trail": depth_first_trail_search,
+    "bfs": breadth_first_tree_search,
+    "bfs-graph": breadth_first_graph_search,
+}
 
 
 if __name__ == "__main__":
-    input_board = Board.parse_instance()
-    problem = Bimaru(input_board)
-    solution = depth_first_tree_search(problem)
-    if solution is not None:
-        print(solution.state)
+    parser = argparse.ArgumentParser(description="Resolve um Bimaru lido do stdin.")
+    parser.add_argument("--branching", choices=Bimaru.BRANCHING, default="fleet")
+    parser.add_argument("--search", choices=SEARCHES, help="procura (por omissão dfs)")
+    parser.add_argument("--backend", choices=("search", "dlx", "cbj", "inplace"), default="search")
+    parser.add_argument(
+        "--mode",
+        choices=("solve", "count", "unique"),
+        default="solve",
+        help="resolve, conta as soluções, ou verifica se a solução é única",
+    )
+    parser.add_argument("--cache", metavar="PATH", help="cache de soluções em sqlite")
+    parser.add_argument("--timeout", type=float, help="limite em segundos (com solve)")
+    parser.add_argument("--max-nodes", type=int, help="limite de nós expandidos (com solve)")
+    parser.add_argument("--max-memory", type=float, help="limite de memória em MiB (com solve)")
+    args = parser.parse_args()
+    limited = args.timeout is not None or args.max_nodes is not None or args.max_memory is not None
+    if limited and (args.backend != "search" or args.mode != "solve"):
+        parser.error("--timeout/--max-nodes/--max-memory only apply to --backend search --mode solve")
+    if limited and args.search not in (None, "dfs-lazy"):
+        parser.error("--timeout/--max-nodes/--max-memory run bimaru.solve (dfs-lazy order)")
+
+    lines = sys.stdin.readlines()
+    cache = None
+    if args.cache and args.mode == "solve":
+        from cache import SolutionCache, instance_key
+
+        cache = SolutionCache(args.cache)
+        key = instance_key(lines)
+        found, text = cache.get(key)
+        if found:
+            # Acerto: nem o Board nem o Bimaru chegam a ser construídos.
+            if text is not None:
+                with SolutionWriter(sys.stdout) as writer:
+                    writer.write_text(text + "\n")
+            sys.exit(0)
+
+    input_board = Board.from_lines(lines)
+    problem = Bimaru(input_board, args.branching)
+    if args.mode != "solve":
+        start = time.perf_counter()
+        count = count_solutions(problem, 2 if args.mode == "unique" else None)
+        elapsed = time.perf_counter() - start
+        if args.mode == "unique":
+            verdict = {0: "no solution", 1: "unique"}.get(count, "not unique")
+            print("{} ({:.3f} seconds)".format(verdict, elapsed))
+        else:
+            print("{} solutions ({:.3f} seconds)".format(count, elapsed))
+        sys.exit(0 if args.mode == "count" or count == 1 else 1)
+    if args.backend == "dlx":
+        from dlx import exact_cover_solve
+
+        state = exact_cover_solve(problem)
+    elif args.backend == "cbj":
+        from cbj import backjump_solve
+
+        state = backjump_solve(problem)
+    elif args.backend == "inplace":
+        from inplace import inplace_solve
+
+        state = inplace_solve(problem)
+    elif limited:
+        outcome = solve(
+            problem,
+            timeout=args.timeout,
+            max_nodes=args.max_nodes,
+            max_memory=args.max_memory * 1024 * 1024 if args.max_memory is not None else None,
+        )
+        state = outcome["state"]
+        if outcome["status"] in ("timeout", "exhausted"):
+            deepest = outcome["deepest"]
+            sys.stderr.write(
+                "{} ({}) after {} nodes, {:.3f} seconds; deepest board, {} ships left:\n{}\n".format(
+                    outcome["status"],
+                    outcome["limit"],
+                    outcome["nodes"],
+                    outcome["time"],
+                    len(deepest.board.ships),
+                    deepest,
+                )
+            )
+            sys.exit(2)
+    else:
+        solution = SEARCHES[args.search or "dfs"](problem)
+        state = solution.state if solution is not None else None
+    if cache is not None:
+        cache.put(key, str(state) if state is not None else None)
+        cache.close()
+    if state is not None:
+        with SolutionWriter(sys.stdout) as writer:
+            writer.write(state)
@@ -0,0 +1,199 @@
+# cache.py: cache persistente de soluções em sqlite.
+#
+# A chave é um hash canónico da instância (contagens das linhas e colunas,
+# frota e pistas ordenadas), calculado diretamente das linhas lidas: um
+# acerto não constrói o Board nem o Bimaru. A cache tem limites de entradas
+# e de bytes; quando são ultrapassados saem as entradas usadas há mais tempo
+# (LRU). Os contadores de acertos, falhas e bytes ficam na própria base de
+# dados.
+#
+# Por exemplo:
+#     $ python3 bimaru.py --cache ~/.bimaru.db < instances-students/instance10.txt
+#     $ python3 cache.py ~/.bimaru.db
+
+import argparse
+import hashlib
+import sqlite3
+import sys
+import time
+
+from bimaru import DEFAULT_FLEET
+
+MAX_ENTRIES = 100000
+MAX_BYTES = 64 * 1024 * 1024
+
+
+def instance_key(lines):
+    """Hash canónico de uma instância: a ordem das pistas, as maiúsculas e
+    uma linha FLEET igual à frota por omissão não mudam a chave."""
+    rows = cols = ""
+    fleet = DEFAULT_FLEET
+    hints = []
+    for line in lines:
+        components = line.split()
+        if not components:
+            continue
+        keyword = components[0].upper()
+        if keyword == "ROW":
+            rows = " ".join(components[1:])
+        elif keyword == "COLUMN":
+            cols = " ".join(components[1:])
+        elif keyword == "FLEET":
+            fleet = list(map(int, components[1:]))
+        elif keyword == "HINT":
+            hints.append((int(components[1]), int(components[2]), components[3].upper()))
+
+    canonical = "ROW {}\nCOLUMN {}\nFLEET {}\n{}".format(
+        rows,
+        cols,
+        " ".join(map(str, sorted(fleet))),
+        "".join("HINT {} {} {}\n".format(*hint) for hint in sorted(hints)),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class SolutionCache:
+    """Soluções indexadas por instance_key. Uma instância sem solução fica
+    guardada com solução None."""
+
+    def __init__(self, path, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path)
+        # WAL sem fsync em cada commit: perder as últimas entradas numa falha
+        # de energia só custa voltar a resolvê-las.
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS solutions (
+                key TEXT PRIMARY KEY,
+                solution TEXT,
+                bytes INTEGER NOT NULL,
+                used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS solutions_used ON solutions (used);
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            """
+        )
+        # Totais de entradas e bytes mantidos em counters, para put não ter
+        # de percorrer a tabela; calculados uma vez numa cache antiga.
+        with self.db:
+            if self.counter("entries") is None:
+                entries, total = self.db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM solutions"
+                ).fetchone()
+                self.count("entries", entries)
+                self.count("bytes", total)
+
+    def counter(self, name):
+        row = self.db.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def count(self, name, amount=1):
+        self.db.execute("INSERT OR IGNORE INTO counters VALUES (?, 0)", (name,))
+        self.db.execute("UPDATE counters SET value = value + ? WHERE name = ?", (amount, name))
+
+    def get(self, key):
+        """Retorna (encontrada, solução)."""
+        with self.db:
+            row = self.db.execute(
+                "SELECT solution, bytes FROM solutions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.count("misses")
+                return False, None
+            self.db.execute("UPDATE solutions SET used = ? WHERE key = ?", (time.time(), key))
+            self.count("hits")
+            self.count("bytes_read", row[1])
+        return True, row[0]
+
+    def put(self, key, solution):
+        size = len(key) + (len(solution) if solution is not None else 0)
+        with self.db:
+            row = self.db.execute("SELECT bytes FROM solutions WHERE key = ?", (key,)).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?)",
+                (key, solution, size, time.time()),
+            )
+            if row is None:
+                self.count("entries")
+                self.count("bytes", size)
+            else:
+                self.count("bytes", size - row[0])
+            self.count("bytes_written", size)
+            self.evict()
+
+    def evict(self):
+        """Retira as entradas usadas há mais tempo até a cache caber nos
+        limites. Só lê, pelo índice de 'used', as entradas que saem."""
+        entries = self.counter("entries")
+        total = self.counter("bytes")
+        if entries <= self.max_entries and total <= self.max_bytes:
+            return
+        evicted = 0
+        freed = 0
+        oldest = self.db.execute("SELECT bytes FROM solutions ORDER BY used")
+        for (size,) in oldest:
+            if entries - evicted <= self.max_entries and total - freed <= self.max_bytes:
+                break
+            evicted += 1
+            freed += size
+        oldest.close()
+        self.db.execute(
+            "DELETE FROM solutions WHERE key IN "
+            "(SELECT key FROM solutions ORDER BY used LIMIT ?)",
+            (evicted,),
+        )
+        self.count("entries", -evicted)
+        self.count("bytes", -freed)
+        self.count("evictions", evicted)
+
+    def stats(self):
+        counters = dict(self.db.execute("SELECT name, value FROM counters"))
+        entries = counters.get("entries", 0)
+        total = counters.get("bytes", 0)
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        return {
+            "entries": entries,
+            "bytes": total,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "evictions": counters.get("evictions", 0),
+            "bytes_read": counters.get("bytes_read", 0),
+            "bytes_written": counters.get("bytes_written", 0),
+        }
+
+    def clear(self):
+        with self.db:
+            self.db.execute("DELETE FROM solutions")
+            self.db.execute("DELETE FROM counters")
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mostra os contadores da cache de soluções.")
+    parser.add_argument("path", help="ficheiro sqlite da cache")
+    parser.add_argument("--clear", action="store_true", help="esvazia a cache")
+    args = parser.parse_args()
+
+    with SolutionCache(args.path) as cache:
+        if args.clear:
+            cache.clear()
+        for name, value in cache.stats().items():
+            if isinstance(value, float):
+                value = "{:.3f}".format(value)
+            sys.stdout.write("{:<14} {}\n".format(name, value))
@@ -0,0 +1,325 @@
+# cbj.py: procura com retrocesso dirigido por conflitos (conflict-directed
+# backjumping) e aprendizagem de nogoods.
+#
+# A ramificação é a do modo "ship" do Bimaru: em cada nível escolhe-se um
+# alvo, um tamanho por colocar ou uma parte de navio por cobrir, e tenta-se
+# cada posição possível para ele. Cada nível é um bit de uma máscara de
+# níveis. Cada razão para uma posição ser impossível é a máscara dos níveis
+# cujas posições a excluem:
+#   - as casas e o halo dos navios colocados (razão guardada por casa);
+#   - as contagens de linhas e colunas já esgotadas (razão por linha);
+#   - o limite de índice dos navios do mesmo tamanho (razão por tamanho);
+#   - os nogoods aprendidos.
+# Quando um alvo fica sem posições, o conflito é a união das razões das
+# posições excluídas e dos conflitos dos filhos. A procura recua logo até
+# ao nível mais recente do conflito, saltando os níveis que não têm culpa,
+# e as ações desses níveis ficam guardadas como um nogood.
+#
+# Por exemplo, para confirmar que a procura chega a saltar num corpus:
+#     $ python3 generator.py --size 10 --count 30 --difficulty medium \
+#           --seed 11 --output corpus/medium10
+#     $ python3 cbj.py --check corpus/medium10
+
+import argparse
+import sys
+
+from bimaru import Bimaru, Board, bits, line_counts
+
+# Só são guardados nogoods com até MAX_NOGOOD ações, até MAX_NOGOODS.
+MAX_NOGOOD = 6
+MAX_NOGOODS = 100000
+
+
+class Backjumper:
+    def __init__(self, problem):
+        self.problem = problem
+        board = problem.initial.board
+        self.height = board.height
+        self.width = board.width
+        self.rows = board.rows.copy()
+        self.cols = board.cols.copy()
+        # Partes de navio deduzidas no tabuleiro inicial, que algum navio
+        # tem de cobrir.
+        self.forced = board.masks["x"]
+
+        self.need = {}
+        for size in board.ships:
+            self.need[size] = self.need.get(size, 0) + 1
+        # Posições compatíveis com o tabuleiro inicial: o resto da procura
+        # só as pode excluir por causa de outras decisões.
+        self.table = {size: problem.candidates(board, size) for size in self.need}
+
+        # Casas ocupadas pelos navios colocados e pelos seus halos; 'covered'
+        # só as dos navios, que são as que satisfazem uma parte forçada.
+        self.taken = 0
+        self.covered = 0
+        self.cell_reason = [0] * (self.height * self.width)
+        self.row_reason = [0] * self.height
+        self.col_reason = [0] * self.width
+        self.floors = dict.fromkeys(self.need, (-1, 0))
+        self.placed_reason = dict.fromkeys(self.need, 0)
+        self.levels = {}
+        self.chosen = []
+        self.solution = None
+
+        self.nogoods = {}
+        self.learned = 0
+        self.nodes = 0
+        self.backjumps = 0
+
+    def exclusion(self, ship):
+        """Razão (máscara de níveis) para 'ship' ser impossível agora, ou 0
+        se ainda é possível. As posições de self.table cabem no tabuleiro
+        inicial, logo uma exclusão tem sempre algum nível culpado.
+
+        Cada causa basta sozinha para excluir a posição, por isso a razão é
+        só uma delas: a de nível mais recente mais antigo, que permite o
+        salto maior. Numa sobreposição a causa é um só navio, o mais antigo;
+        as contagens e o limite de índice ficam com todos os seus níveis."""
+        reason = 0
+        overlap = ship.mask & self.taken
+        if overlap:
+            cell_reason = self.cell_reason
+            for index in bits(overlap):
+                reason |= cell_reason[index]
+            reason &= -reason
+        floor, level = self.floors[ship.size]
+        if ship.index <= floor and (not reason or level.bit_length() < reason.bit_length()):
+            reason = level
+        rows = self.rows
+        for i, count in ship.rows:
+            if rows[i] < count:
+                why = self.row_reason[i]
+                if not reason or why.bit_length() < reason.bit_length():
+                    reason = why
+        cols = self.cols
+        for j, count in ship.cols:
+            if cols[j] < count:
+                why = self.col_reason[j]
+                if not reason or why.bit_length() < reason.bit_length():
+                    reason = why
+        return reason
+
+    def blocked(self, action):
+        """Razão para um nogood impedir 'action', ou None."""
+        for nogood in self.nogoods.get(action, ()):
+            reason = 0
+            for other in nogood:
+                if other == action:
+                    continue
+                level = self.levels.get(other)
+                if level is None:
+                    break
+                reason |= level
+            else:
+                return reason
+        return None
+
+    def choose(self):
+        """Alvo com menos posições possíveis (MRV). Retorna (ações, razão
+        das posições excluídas), ou None se já não há alvos."""
+        live = []
+        excluded = []
+        targets = []
+        for size, ships in self.table.items():
+            need = self.need[size]
+            if not need:
+                # Tamanho esgotado: culpa de quem colocou esses navios.
+                why = self.placed_reason[size]
+                excluded += [(ship, why) for ship in ships]
+                continue
+            options = []
+            reason = 0
+            for ship in ships:
+                why = self.exclusion(ship)
+                if why:
+                    reason |= why
+                    excluded.append((ship, why))
+                else:
+                    options.append(ship)
+            live += options
+            targets.append((len(options), [(ship, True) for ship in options], reason))
+
+        # Uma parte forçada no halo de um navio continua por cobrir: todas
+        # as posições que a cobririam estão excluídas e o alvo fica vazio.
+        for index in bits(self.forced & ~self.covered):
+            options = [(ship, False) for ship in live if ship.mask >> index & 1]
+            reason = 0
+            for ship, why in excluded:
+                if ship.mask >> index & 1:
+                    reason |= why
+            targets.append((len(options), options, reason))
+
+        # Linhas e colunas cuja contagem já não pode ser atingida com as
+        # posições restantes (line_counts). A culpa é dos navios já colocados
+        # nelas e das posições excluídas que lhes acrescentariam casas ao
+        # alcance; as dos tamanhos esgotados contam sempre que tocam a linha,
+        # porque também mudam 'sizes'.
+        reach = 0
+        for ship in live:
+            reach |= ship.mask
+        forced = self.forced & ~self.covered
+        sizes = frozenset(size for size, need in self.need.items() if need)
+        width = self.width
+        lines = [
+            (i * width, 1, width, count, self.row_reason[i])
+            for i, count in enumerate(self.rows)
+            if count
+        ]
+        lines += [
+            (j, width, self.height, count, self.col_reason[j])
+            for j, count in enumerate(self.cols)
+            if count
+        ]
+        for start, step, length, count, reason in lines:
+            line_reach = 0
+            line_forced = 0
+            for t in range(length):
+                index = start + t * step
+                line_reach |= (reach >> index & 1) << t
+                line_forced |= (forced >> index & 1) << t
+            if sizes and line_counts(line_reach, line_forced, length, sizes) >> count & 1:
+                continue
+            mask = 0
+            for t in range(length):
+                mask |= 1 << (start + t * step)
+            for ship, why in excluded:
+                if ship.mask & mask and (ship.mask & mask & ~reach or ship.size not in sizes):
+                    reason |= why
+            targets.append((0, [], reason))
+
+        if not targets:
+            return None
+        amount, actions, reason = min(targets, key=lambda target: target[0])
+        if not amount:
+            # Entre os alvos sem posições, o conflito com o nível mais
+            # recente mais antigo, para recuar o mais possível.
+            reason = min(
+                (target[2] for target in targets if not target[0]),
+                key=lambda reason: reason.bit_length(),
+            )
+        return actions, reason
+
+    def apply(self, action, level):
+        ship, lowest = action
+        bit = 1 << level
+        saved = (self.taken, self.covered, self.floors[ship.size], self.placed_reason[ship.size])
+        self.taken |= ship.mask | ship.halo
+        self.covered |= ship.mask
+        cell_reason = self.cell_reason
+        for index in bits(ship.mask | ship.halo):
+            cell_reason[index] |= bit
+        for i, count in ship.rows:
+            self.rows[i] -= count
+            self.row_reason[i] |= bit
+        for j, count in ship.cols:
+            self.cols[j] -= count
+            self.col_reason[j] |= bit
+        if lowest:
+            self.floors[ship.size] = (ship.index, bit)
+        self.placed_reason[ship.size] |= bit
+        self.need[ship.size] -= 1
+        self.levels[action] = bit
+        self.chosen.append(ship)
+        return saved
+
+    def undo(self, action, level, saved):
+        ship, lowest = action
+        clear = ~(1 << level)
+        self.taken, self.covered, self.floors[ship.size], self.placed_reason[ship.size] = saved
+        cell_reason = self.cell_reason
+        for index in bits(ship.mask | ship.halo):
+            cell_reason[index] &= clear
+        for i, count in ship.rows:
+            self.rows[i] += count
+            self.row_reason[i] &= clear
+        for j, count in ship.cols:
+            self.cols[j] += count
+            self.col_reason[j] &= clear
+        self.need[ship.size] += 1
+        del self.levels[action]
+        self.chosen.pop()
+
+    def learn(self, conflict):
+        """Guarda como nogood as ações dos níveis em 'conflict'."""
+        if self.learned >= MAX_NOGOODS:
+            return
+        nogood = frozenset(
+            action for action, level in self.levels.items() if level & conflict
+        )
+        if not nogood or len(nogood) > MAX_NOGOOD:
+            return
+        for action in nogood:
+            self.nogoods.setdefault(action, []).append(nogood)
+        self.learned += 1
+
+    def search(self, level=0):
+        """Retorna (True, 0) com a solução em self.solution, ou (False,
+        conflito), em que o conflito é a máscara dos níveis culpados."""
+        self.nodes += 1
+        target = self.choose()
+        if target is None:
+            self.solution = list(self.chosen)
+            return True, 0
+        actions, conflict = target
+        bit = 1 << level
+        for action in actions:
+            reason = self.blocked(action)
+            if reason is not None:
+                conflict |= reason
+                continue
+
+            saved = self.apply(action, level)
+            solved, child = self.search(level + 1)
+            self.undo(action, level, saved)
+            if solved:
+                return True, 0
+            if not child & bit:
+                # Este nível não tem culpa: salta logo para o culpado.
+                self.backjumps += 1
+                return False, child
+            conflict |= child & ~bit
+        self.learn(conflict)
+        return False, conflict
+
+    def solve(self):
+        """Lista de posições de uma solução, ou None."""
+        if self.problem.initial.board.dead:
+            return None
+        solved, conflict = self.search()
+        return self.solution if solved else None
+
+
+def backjump_solve(problem):
+    """Resolve 'problem' (um Bimaru) com backjumping e nogoods. Retorna o
+    estado final, igual ao que a procura em árvore daria, ou None."""
+    chosen = Backjumper(problem).solve()
+    if chosen is None:
+        return None
+    return problem.place(problem.initial, chosen)
+
+
+if __name__ == "__main__":
+    from batch import instance_paths
+
+    parser = argparse.ArgumentParser(
+        description="Resolve instâncias com backjumping e mostra os contadores."
+    )
+    parser.add_argument("paths", nargs="+", help="ficheiros, diretórios ou globs de .txt")
+    parser.add_argument(
+        "--check", action="store_true", help="falha se a procura nunca saltar um nível"
+    )
+    args = parser.parse_args()
+
+    totals = {"instances": 0, "solved": 0, "nodes": 0, "backjumps": 0, "nogoods": 0}
+    for path in instance_paths(args.paths):
+        with open(path) as stream:
+            backjumper = Backjumper(Bimaru(Board.parse_instance(stream), "ship"))
+        totals["instances"] += 1
+        totals["solved"] += backjumper.solve() is not None
+        totals["nodes"] += backjumper.nodes
+        totals["backjumps"] += backjumper.backjumps
+        totals["nogoods"] += backjumper.learned
+    for name, value in totals.items():
+        sys.stdout.write("{:<10} {}\n".format(name, value))
+    sys.exit(1 if args.check and not totals["backjumps"] else 0)
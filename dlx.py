@@ -0,0 +1,196 @@
+# dlx.py: Bimaru como problema de cobertura exata generalizada.
+#
+# As linhas da matriz são as posições de navio compatíveis com o tabuleiro
+# inicial (Bimaru.candidates). As colunas são:
+#   ("ship", s)   primária, a cobrir tantas vezes quantos navios de tamanho s;
+#   ("cell", i)   primária, uma parte de navio já conhecida (pista ou
+#                 deduzida) que tem de ser coberta exatamente uma vez;
+#   ("block", b)  secundária, cada bloco 2x2 da grelha: dois navios tocam-se
+#                 se e só se partilham um bloco, logo cada bloco é usado no
+#                 máximo uma vez.
+# As contagens de linhas e colunas são restrições de contagem, verificadas
+# ao escolher cada posição e no fim.
+#
+# A procura é o Algoritmo X com a matriz em dicionários de conjuntos (a
+# versão de "dancing links" sobre dicionários): cobrir uma coluna retira as
+# linhas incompatíveis, e descobri-la repõe-nas pela ordem inversa.
+
+from functools import lru_cache
+
+from bimaru import bits, column_bits, line_counts, rect_mask
+
+
+@lru_cache(maxsize=None)
+def block_masks(height, width):
+    """Máscara de cada bloco 2x2 (truncado nos tabuleiros com uma só linha
+    ou coluna)."""
+    return tuple(
+        rect_mask(width, i, j, min(i + 1, height - 1), min(j + 1, width - 1))
+        for i in range(max(height - 1, 1))
+        for j in range(max(width - 1, 1))
+    )
+
+
+class ExactCover:
+    def __init__(self, problem):
+        self.problem = problem
+        board = problem.initial.board
+        self.height = board.height
+        self.width = board.width
+        self.rows = board.rows.copy()
+        self.cols = board.cols.copy()
+
+        self.need = {}
+        for size in board.ships:
+            self.need[size] = self.need.get(size, 0) + 1
+        self.floors = dict.fromkeys(self.need, -1)
+
+        blocks = block_masks(self.height, self.width)
+        self.X = {("ship", size): set() for size in self.need}
+        self.X.update((("cell", index), set()) for index in bits(board.masks["x"]))
+        self.Y = {}
+        for size in self.need:
+            for ship in problem.candidates(board, size):
+                columns = [("ship", size)]
+                columns += [("cell", index) for index in bits(ship.mask & board.masks["x"])]
+                columns += [
+                    ("block", number)
+                    for number, block in enumerate(blocks)
+                    if block & ship.mask
+                ]
+                self.Y[ship] = columns
+                for column in columns:
+                    self.X.setdefault(column, set()).add(ship)
+
+    def select(self, ship, finish):
+        """Cobre as colunas de 'ship'. A coluna do tamanho só é coberta
+        (retirando as restantes posições desse tamanho) com 'finish'."""
+        X = self.X
+        removed = []
+        for column in self.Y[ship]:
+            if column[0] == "ship" and not finish:
+                continue
+            for other in X[column]:
+                for k in self.Y[other]:
+                    if k != column:
+                        X[k].remove(other)
+            removed.append((column, X.pop(column)))
+        return removed
+
+    def deselect(self, ship, removed):
+        X = self.X
+        for column, ships in reversed(removed):
+            X[column] = ships
+            for other in ships:
+                for k in self.Y[other]:
+                    if k != column:
+                        X[k].add(other)
+
+    def fits(self, ship):
+        if ship.index <= self.floors[ship.size]:
+            return False
+        rows = self.rows
+        cols = self.cols
+        return all(rows[i] >= count for i, count in ship.rows) and all(
+            cols[j] >= count for j, count in ship.cols
+        )
+
+    def reachable(self):
+        """Cada linha e coluna com contagem em falta tem de a poder atingir
+        (line_counts) com as casas ao alcance das posições que ainda
+        restam e as partes de navio conhecidas por cobrir."""
+        reach = 0
+        forced = 0
+        sizes = frozenset(size for size, need in self.need.items() if need)
+        for size in sizes:
+            for ship in self.X[("ship", size)]:
+                if self.fits(ship):
+                    reach |= ship.mask
+        for column in self.X:
+            if column[0] == "cell":
+                forced |= 1 << column[1]
+
+        width = self.width
+        row_full = (1 << width) - 1
+        for i, count in enumerate(self.rows):
+            if count:
+                shift = i * width
+                counts = line_counts(
+                    (reach >> shift) & row_full, (forced >> shift) & row_full, width, sizes
+                )
+                if not counts >> count & 1:
+                    return False
+        for j, count in enumerate(self.cols):
+            if count:
+                counts = line_counts(
+                    column_bits(reach, j, self.height, width),
+                    column_bits(forced, j, self.height, width),
+                    self.height,
+                    sizes,
+                )
+                if not counts >> count & 1:
+                    return False
+        return True
+
+    def choose(self):
+        """Coluna primária por cobrir com menos candidatos (MRV)."""
+        best = None
+        for column, ships in self.X.items():
+            if column[0] == "block":
+                continue
+            if best is None or len(ships) < len(self.X[best]):
+                best = column
+        return best
+
+    def solutions(self, chosen=None):
+        """Gera cada solução como a lista de posições escolhidas."""
+        if chosen is None:
+            chosen = []
+        column = self.choose()
+        if column is None:
+            if not any(self.rows) and not any(self.cols):
+                yield list(chosen)
+            return
+        if not self.reachable():
+            return
+
+        candidates = sorted(
+            (ship for ship in self.X[column] if self.fits(ship)),
+            key=lambda ship: (ship.size, ship.index),
+        )
+        for ship in candidates:
+            size = ship.size
+            floor = self.floors[size]
+            if column[0] == "ship":
+                # Navios do mesmo tamanho por ordem crescente de índice.
+                self.floors[size] = ship.index
+            self.need[size] -= 1
+            for i, count in ship.rows:
+                self.rows[i] -= count
+            for j, count in ship.cols:
+                self.cols[j] -= count
+            removed = self.select(ship, self.need[size] == 0)
+            chosen.append(ship)
+
+            yield from self.solutions(chosen)
+
+            chosen.pop()
+            self.deselect(ship, removed)
+            for i, count in ship.rows:
+                self.rows[i] += count
+            for j, count in ship.cols:
+                self.cols[j] += count
+            self.need[size] += 1
+            self.floors[size] = floor
+
+
+def exact_cover_solve(problem):
+    """Resolve 'problem' (um Bimaru) com o Algoritmo X. Retorna o estado
+    final, igual ao que a procura em árvore daria, ou None."""
+    if problem.initial.board.dead:
+        # A propagação inicial já encontrou uma contradição e limpou as
+        # máscaras: as posições restantes dariam uma falsa solução.
+        return None
+    for chosen in ExactCover(problem).solutions():
+        return problem.place(problem.initial, chosen)
+    return None
@@ -0,0 +1,152 @@
+# generator.py: gera instâncias aleatórias de Bimaru para benchmarks.
+#
+# Cada instância parte de uma disposição aleatória válida da frota; as
+# contagens de linhas e colunas saem da disposição e são reveladas algumas
+# pistas. Com --unique são acrescentadas pistas até a solução ser única.
+# A mesma semente gera sempre o mesmo corpus.
+#
+# Por exemplo:
+#     $ python3 generator.py --size 15 --count 50 --difficulty hard --unique \
+#           --seed 7 --output corpus/hard15
+
+import argparse
+import os
+import random
+import sys
+
+from bimaru import DEFAULT_FLEET, Bimaru, Board, bits, count_solutions, placement_table
+
+# Número de pistas, por navio da frota, de cada dificuldade.
+DIFFICULTIES = {"easy": 1.0, "medium": 0.5, "hard": 0.0}
+
+
+def random_layout(height, width, fleet, rng, attempts=1000):
+    """Escolhe uma posição para cada navio de 'fleet', sem se tocarem.
+    Retorna a lista de Placements, ou None se não conseguir."""
+    for attempt in range(attempts):
+        layout = []
+        blocked = 0
+        for size in sorted(fleet, reverse=True):
+            options = [
+                ship
+                for ship in placement_table(height, width, size)
+                if not ship.mask & blocked
+            ]
+            if not options:
+                break
+            ship = rng.choice(options)
+            layout.append(ship)
+            blocked |= ship.mask | ship.halo
+        else:
+            return layout
+    return None
+
+
+def layout_tiles(height, width, layout):
+    tiles = [["."] * width for i in range(height)]
+    for ship in layout:
+        for part, mask in ship.parts.items():
+            for index in bits(mask):
+                tiles[index // width][index % width] = part
+    return tiles
+
+
+def instance_lines(tiles, fleet, hints):
+    height = len(tiles)
+    width = len(tiles[0])
+    rows = [sum(tile != "." for tile in row) for row in tiles]
+    cols = [sum(tiles[i][j] != "." for i in range(height)) for j in range(width)]
+    lines = [
+        "\t".join(["ROW"] + list(map(str, rows))),
+        "\t".join(["COLUMN"] + list(map(str, cols))),
+    ]
+    if sorted(fleet) != DEFAULT_FLEET:
+        lines.append("\t".join(["FLEET"] + list(map(str, sorted(fleet, reverse=True)))))
+    lines.append(str(len(hints)))
+    for row, col in sorted(hints):
+        hint = tiles[row][col]
+        lines.append("HINT\t{}\t{}\t{}".format(row, col, "W" if hint == "." else hint.upper()))
+    return [line + "\n" for line in lines]
+
+
+def solutions(problem, limit):
+    """Até 'limit' estados objetivo distintos (ver bimaru.count_solutions)."""
+    found = []
+    count_solutions(problem, limit, found)
+    return found
+
+
+def generate(height, width, fleet, hints, rng, unique=False):
+    """Gera uma instância. Retorna (linhas da instância, solução em texto)."""
+    layout = random_layout(height, width, fleet, rng)
+    if layout is None:
+        raise ValueError("fleet does not fit in a {}x{} board".format(height, width))
+    tiles = layout_tiles(height, width, layout)
+
+    cells = [(i, j) for i in range(height) for j in range(width)]
+    revealed = set(rng.sample(cells, min(hints, len(cells))))
+    while True:
+        lines = instance_lines(tiles, fleet, revealed)
+        if not unique:
+            break
+        problem = Bimaru(Board.from_lines(lines), "ship")
+        found = solutions(problem, 2)
+        if len(found) < 2:
+            break
+        # Revela uma casa onde a outra solução difere da disposição.
+        other = found[0].board.tiles
+        if all(other[i][j] == tiles[i][j] for i, j in cells):
+            other = found[1].board.tiles
+        differing = [
+            (i, j) for i, j in cells
+            if (i, j) not in revealed and other[i][j] != tiles[i][j]
+        ]
+        revealed.add(rng.choice(differing))
+
+    problem = Bimaru(Board.from_lines(lines))
+    return lines, str(problem.result(problem.initial, tuple(layout)))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Gera instâncias aleatórias de Bimaru.")
+    parser.add_argument("--size", type=int, default=10, help="lado do tabuleiro")
+    parser.add_argument("--height", type=int, help="número de linhas (por omissão --size)")
+    parser.add_argument("--width", type=int, help="número de colunas (por omissão --size)")
+    parser.add_argument("--fleet", help="tamanhos dos navios, separados por vírgulas")
+    parser.add_argument("--hints", type=int, help="número de pistas reveladas")
+    parser.add_argument("--difficulty", choices=DIFFICULTIES, default="medium")
+    parser.add_argument("--unique", action="store_true", help="garante solução única")
+    parser.add_argument("--count", type=int, default=1, help="número de instâncias")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="diretório onde escrever instanceNNN.txt/.out")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    height = args.height or args.size
+    width = args.width or args.size
+    fleet = list(map(int, args.fleet.split(","))) if args.fleet else DEFAULT_FLEET
+    hints = args.hints
+    if hints is None:
+        hints = int(DIFFICULTIES[args.difficulty] * len(fleet))
+
+    rng = random.Random(args.seed)
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    for number in range(1, args.count + 1):
+        lines, solution = generate(height, width, fleet, hints, rng, args.unique)
+        if not args.output:
+            sys.stdout.writelines(lines)
+            continue
+        name = os.path.join(args.output, "instance{:03d}".format(number))
+        with open(name + ".txt", "w") as stream:
+            stream.writelines(lines)
+        # Só com solução única é que o .out é a resposta esperada do solver.
+        if args.unique:
+            with open(name + ".out", "w") as stream:
+                stream.write(solution + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# inplace.py: procura recursiva sobre um só tabuleiro mutável (make/unmake).
+#
+# Em vez de Bimaru.result construir um Board novo por filho, cada ação é
+# aplicada ao mesmo tabuleiro e propagada (Board.propagate). Todas as
+# escritas nas máscaras ficam num rasto com o valor antigo; ao recuar, o
+# rasto é desfeito por ordem inversa até à marca da ação, e as contagens e a
+# frota restante repõem-se somando o que a ação tirou. As ações são as do
+# próprio Bimaru, nos dois modos de ramificação.
+
+from bisect import insort
+
+from bimaru import Board, BimaruState
+
+
+class TrailedMasks(dict):
+    """Dicionário de máscaras que guarda em 'trail' o valor antigo de cada
+    escrita, para a poder desfazer."""
+
+    __slots__ = ("trail",)
+
+    def __init__(self, masks, trail):
+        super().__init__(masks)
+        self.trail = trail
+
+    def __setitem__(self, key, value):
+        self.trail.append((key, dict.__getitem__(self, key)))
+        dict.__setitem__(self, key, value)
+
+    def undo(self, mark):
+        """Desfaz as escritas feitas depois de 'mark' (um len(trail))."""
+        trail = self.trail
+        while len(trail) > mark:
+            key, value = trail.pop()
+            dict.__setitem__(self, key, value)
+
+
+class InPlaceSolver:
+    def __init__(self, problem):
+        self.problem = problem
+        initial = problem.initial.board
+        self.trail = []
+        self.board = Board(
+            initial.cols.copy(),
+            initial.rows.copy(),
+            TrailedMasks(initial.masks, self.trail),
+            initial.hints,
+            initial.ships.copy(),
+        )
+        # Estado que Bimaru.actions lê: o tabuleiro mutável e os limites do
+        # modo "ship", também alterados no lugar. Os contadores do goal_test
+        # não são usados (ver goal).
+        self.state = BimaruState(self.board, {}, 0, 0, 0)
+        self.chosen = []
+        self.nodes = 0
+
+    def make(self, ships):
+        """Aplica 'ships' ao tabuleiro e propaga. Retorna a marca do rasto."""
+        board = self.board
+        masks = board.masks
+        mark = len(self.trail)
+        for ship in ships:
+            masks["0"] &= ~(ship.mask | ship.halo)
+            masks["x"] &= ~ship.mask
+            masks["."] |= ship.halo
+            for part, mask in ship.parts.items():
+                masks[part] |= mask
+            for i, count in ship.rows:
+                board.rows[i] -= count
+            for j, count in ship.cols:
+                board.cols[j] -= count
+            board.ships.remove(ship.size)
+            self.chosen.append(ship)
+        board.propagate()
+        return mark
+
+    def unmake(self, ships, mark):
+        board = self.board
+        board.masks.undo(mark)
+        for ship in ships:
+            for i, count in ship.rows:
+                board.rows[i] += count
+            for j, count in ship.cols:
+                board.cols[j] += count
+            insort(board.ships, ship.size)
+            self.chosen.pop()
+        board.dead = False
+
+    def goal(self):
+        board = self.board
+        return (
+            not board.ships
+            and not board.masks["x"]
+            and not any(board.rows)
+            and not any(board.cols)
+        )
+
+    def search(self):
+        """True se encontrou uma solução, com os navios em self.chosen."""
+        self.nodes += 1
+        if self.goal():
+            return True
+
+        ship_mode = self.problem.branching == "ship"
+        floors = self.state.floors
+        # Pela mesma ordem que depth_first_tree_search, que tira da pilha
+        # primeiro a última ação.
+        actions = list(self.problem.actions(self.state))
+        for action in reversed(actions):
+            if ship_mode:
+                ship, lowest = action
+                ships = (ship,)
+                floor = floors.get(ship.size)
+                if lowest:
+                    floors[ship.size] = ship.index
+            else:
+                ships = action
+
+            mark = self.make(ships)
+            if not self.board.dead and self.search():
+                return True
+            self.unmake(ships, mark)
+
+            if ship_mode and lowest:
+                if floor is None:
+                    del floors[ship.size]
+                else:
+                    floors[ship.size] = floor
+        return False
+
+    def solve(self):
+        """Lista de posições de uma solução, ou None."""
+        if self.board.dead or not self.search():
+            return None
+        return list(self.chosen)
+
+
+def inplace_solve(problem):
+    """Resolve 'problem' (um Bimaru) com make/unmake num só tabuleiro.
+    Retorna o estado final, igual ao que a procura em árvore daria, ou None."""
+    chosen = InPlaceSolver(problem).solve()
+    if chosen is None:
+        return None
+    return problem.place(problem.initial, chosen)
@@ -0,0 +1,165 @@
+# parallel.py: resolve um só tabuleiro de Bimaru com vários processos.
+#
+# A raiz da árvore de procura é expandida até haver trabalho para todos os
+# processos. Cada subárvore é identificada pelo caminho de ações desde a
+# raiz; um processo que a recebe refaz o caminho e faz DFS a partir daí.
+# Quando há processos parados, quem está a trabalhar cede os nós mais
+# próximos da raiz da sua pilha (work-stealing). O primeiro objetivo
+# encontrado cancela todos os processos.
+#
+# Por exemplo:
+#     $ python3 parallel.py --workers 8 < instances-students/instance10.txt
+
+import argparse
+import multiprocessing
+import queue
+import sys
+from collections import deque
+
+from bimaru import Bimaru, Board
+
+# Nós expandidos entre verificações de cancelamento e de pedidos de trabalho.
+CHECK_INTERVAL = 64
+
+
+def replay(problem, path):
+    state = problem.initial
+    for action in path:
+        state = problem.result(state, action)
+    return state
+
+
+def worker(lines, branching, tasks, results, pending, idle, stop):
+    problem = Bimaru(Board.from_lines(lines), branching)
+    while not stop.is_set():
+        with idle.get_lock():
+            idle.value += 1
+        try:
+            path = tasks.get(timeout=0.05)
+        except queue.Empty:
+            with idle.get_lock():
+                idle.value -= 1
+            if pending.value == 0:
+                return
+            continue
+        with idle.get_lock():
+            idle.value -= 1
+
+        solution = explore(problem, path, tasks, pending, idle, stop)
+        if solution is not None:
+            results.put(solution)
+            stop.set()
+        with pending.get_lock():
+            pending.value -= 1
+
+
+def explore(problem, path, tasks, pending, idle, stop):
+    """DFS da subárvore em 'path'. Retorna o caminho até um objetivo, ou None."""
+    stack = [(replay(problem, path), tuple(path))]
+    expanded = 0
+    while stack:
+        state, path = stack.pop()
+        if problem.goal_test(state):
+            return path
+        for action in problem.actions(state):
+            stack.append((problem.result(state, action), path + (action,)))
+
+        expanded += 1
+        if expanded % CHECK_INTERVAL:
+            continue
+        if stop.is_set():
+            return None
+        if idle.value and len(stack) > 1 and tasks.empty():
+            # Cede metade da pilha, começando pelo fundo (os nós mais rasos).
+            donated = stack[: len(stack) // 2]
+            del stack[: len(stack) // 2]
+            with pending.get_lock():
+                pending.value += len(donated)
+            for state, path in donated:
+                tasks.put(path)
+    return None
+
+
+def split(problem, minimum):
+    """Expande a raiz em largura, um nó de cada vez, até haver pelo menos
+    'minimum' subárvores. Retorna (caminhos, solução), em que a solução pode
+    ser encontrada logo nesta fase."""
+    frontier = deque([(problem.initial, ())])
+    while frontier and len(frontier) < minimum:
+        state, path = frontier.popleft()
+        if problem.goal_test(state):
+            return [], path
+        for action in problem.actions(state):
+            frontier.append((problem.result(state, action), path + (action,)))
+    return [path for state, path in frontier], None
+
+
+def parallel_solve(lines, branching="fleet", workers=None, split_factor=4):
+    """Resolve a instância em 'lines' com 'workers' processos. Retorna o
+    estado objetivo, ou None se não houver solução."""
+    workers = workers or multiprocessing.cpu_count()
+    problem = Bimaru(Board.from_lines(lines), branching)
+    paths, solution = split(problem, workers * split_factor)
+    if solution is not None:
+        return replay(problem, solution)
+    if not paths:
+        return None
+
+    tasks = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    pending = multiprocessing.Value("i", len(paths))
+    idle = multiprocessing.Value("i", 0)
+    stop = multiprocessing.Event()
+    for path in paths:
+        tasks.put(path)
+
+    processes = [
+        multiprocessing.Process(
+            target=worker,
+            args=(lines, branching, tasks, results, pending, idle, stop),
+            daemon=True,
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    solution = None
+    while solution is None:
+        try:
+            solution = results.get(timeout=0.05)
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                # Um processo pode ter terminado logo depois de publicar.
+                try:
+                    solution = results.get(timeout=0.05)
+                except queue.Empty:
+                    pass
+                break
+
+    stop.set()
+    for process in processes:
+        process.terminate()
+        process.join()
+    # Os caminhos por ler ficam na fila: sem isto, o processo espera à saída
+    # que a thread que os escreve na pipe termine, o que nunca acontece.
+    for channel in (tasks, results):
+        channel.cancel_join_thread()
+        channel.close()
+
+    if solution is None:
+        return None
+    return replay(problem, solution)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Resolve um Bimaru lido do stdin com vários processos."
+    )
+    parser.add_argument("--branching", choices=Bimaru.BRANCHING, default="fleet")
+    parser.add_argument("-w", "--workers", type=int, help="número de processos")
+    args = parser.parse_args()
+
+    state = parallel_solve(sys.stdin.readlines(), args.branching, args.workers)
+    if state is not None:
+        print(state)
@@ -213,6 +213,38 @@ def depth_first_tree_search(problem):
     return None
 
 
+def depth_first_lazy_tree_search(problem):
+    """
+    Search the deepest nodes in the search tree first, like
+    depth_first_tree_search, but without expanding a node all at once.
+    The frontier holds each node together with an iterator over its actions,
+    and a child node is only built when it is about to be explored.
+    Children are visited in the order problem.actions yields them, so a
+    lazy actions generator is never consumed past the child being explored.
+    """
+
+    def pending(node):
+        return iter(problem.actions(node.state))
+
+    root = Node(problem.initial)
+    if problem.goal_test(root.state):
+        return root
+    frontier = [(root, pending(root))]  # Stack
+
+    while frontier:
+        node, actions = frontier[-1]
+        for action in actions:
+            break
+        else:
+            frontier.pop()
+            continue
+        child = node.child_node(problem, action)
+        if problem.goal_test(child.state):
+            return child
+        frontier.append((child, pending(child)))
+    return None
+
+
 def depth_first_graph_search(problem):
     """
     [Figure 3.7]